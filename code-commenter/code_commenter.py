@@ -11,6 +11,10 @@ from IPython.display import Markdown, display, update_display
 import gradio as gr
 import subprocess
 
+# Shared with the other LLM tools in this repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "llm-common"))
+from llm_metrics import StreamMetrics, instrumented
+
 load_dotenv(override=True)
 os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY', 'your-key-if-not-using-env')
 os.environ['ANTHROPIC_API_KEY'] = os.getenv('ANTHROPIC_API_KEY', 'your-key-if-not-using-env')
@@ -102,26 +106,28 @@ print("Total Maximum Subarray Sum (20 runs):", result)
 print("Execution Time: {:.6f} seconds".format(end_time - start_time))
 """
 
-def stream_gpt(python):    
-    stream = openai.chat.completions.create(model=OPENAI_MODEL, messages=messages_for(python), stream=True)
-    reply = ""
-    for chunk in stream:
-        fragment = chunk.choices[0].delta.content or ""
-        reply += fragment
-        yield reply.replace('```cpp\n','').replace('```','')
+def clean_reply(reply):
+    return reply.replace('```cpp\n','').replace('```','')
+
+def stream_gpt(python):
+    metrics = StreamMetrics("code_commenter", "openai", OPENAI_MODEL)
+    fragments = metrics.openai(lambda: openai.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages_for(python),
+        stream=True,
+        stream_options={"include_usage": True},
+    ))
+    yield from instrumented(fragments, metrics, clean_reply)
 
 def stream_claude(python):
-    result = claude.messages.stream(
+    metrics = StreamMetrics("code_commenter", "anthropic", CLAUDE_MODEL)
+    fragments = metrics.anthropic(lambda: claude.messages.stream(
         model=CLAUDE_MODEL,
         max_tokens=2000,
         system=system_message,
         messages=[{"role": "user", "content": user_prompt_for(python)}],
-    )
-    reply = ""
-    with result as stream:
-        for text in stream.text_stream:
-            reply += text
-            yield reply.replace('```cpp\n','').replace('```','')
+    ))
+    yield from instrumented(fragments, metrics, clean_reply)
 
 def comment_code(python, model):
     if model=="GPT":
@@ -130,8 +136,8 @@ def comment_code(python, model):
         result = stream_claude(python)
     else:
         raise ValueError("Unknown model")
-    for stream_so_far in result:
-        yield stream_so_far        
+    for stream_so_far, latency in result:
+        yield stream_so_far, latency
 
 def select_sample_program(sample_program):
     if sample_program=="pi":
@@ -150,10 +156,13 @@ with gr.Blocks() as ui:
         commented_python = gr.Textbox(label="Commented code:", lines=10)
     with gr.Row():
         model = gr.Dropdown(["GPT", "Claude"], label="Select model", value="GPT")
+    with gr.Row():
+        latency = gr.Markdown()
     with gr.Row():
         comment = gr.Button("Comment")
 
     sample_program.change(select_sample_program, inputs=[sample_program], outputs=[python])
-    comment.click(comment_code, inputs=[python, model], outputs=[commented_python])
+    comment.click(comment_code, inputs=[python, model], outputs=[commented_python, latency])
 
-ui.launch(inbrowser=True)
+if __name__ == "__main__":
+    ui.launch(inbrowser=True)
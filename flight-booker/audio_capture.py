@@ -0,0 +1,207 @@
+import time
+import wave
+from io import BytesIO
+import numpy as np
+
+
+class RingBuffer:
+    """Preallocated int16 ring that keeps the most recent `capacity` samples"""
+
+    def __init__(self, capacity):
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.written = 0  # total samples ever written, used as an absolute position
+
+    def write(self, samples):
+        total = len(samples)
+        samples = samples[-self.capacity:]
+        self.written += total - len(samples)
+        start = self.written % self.capacity
+        end = start + len(samples)
+        if end <= self.capacity:
+            self._data[start:end] = samples
+        else:
+            split = self.capacity - start
+            self._data[start:] = samples[:split]
+            self._data[:end - self.capacity] = samples[split:]
+        self.written += len(samples)
+
+    def read(self, since):
+        """Copy of the samples from absolute position `since` (clamped to what is still held) to now"""
+        since = max(since, self.written - self.capacity, 0)
+        count = self.written - since
+        start = since % self.capacity
+        if start + count <= self.capacity:
+            return self._data[start:start + count].copy()
+        return np.concatenate((self._data[start:], self._data[:start + count - self.capacity]))
+
+
+class EnergyVAD:
+    """Energy-based voice activity detection with an adaptive noise floor.
+
+    The first `calibration_seconds` measure the noise floor. After that a frame is speech
+    when its RMS is above both an absolute floor and `speech_ratio` times the running noise
+    estimate. The noise floor never rises above `max_noise_dbfs`, and louder frames during
+    calibration are treated as possible speech, so talking straight away can't become the floor. Speech has to last `min_speech_seconds` to count, and the utterance ends after
+    `silence_seconds` of trailing silence.
+    """
+
+    def __init__(self, sample_rate, threshold_dbfs=-45.0, speech_ratio=3.0, calibration_seconds=0.2,
+                 min_speech_seconds=0.2, silence_seconds=0.8, noise_adaptation=0.05, max_noise_dbfs=-35.0):
+        self.sample_rate = sample_rate
+        self.min_rms = 32768 * 10 ** (threshold_dbfs / 20)
+        self.max_noise_rms = 32768 * 10 ** (max_noise_dbfs / 20)
+        self.speech_ratio = speech_ratio
+        self.min_speech_samples = int(min_speech_seconds * sample_rate)
+        self.silence_samples = int(silence_seconds * sample_rate)
+        self.noise_adaptation = noise_adaptation
+        self.calibration_samples = int(calibration_seconds * sample_rate)
+        self.noise_floor = 0.0
+        self._calibrated = 0
+        self._noise_samples = 0
+        self.speech_started = False
+        self.speech_start = None  # absolute sample position where speech began
+        self._speech_run = 0
+        self._silence_run = 0
+
+    def update(self, frame, position):
+        """Feed the frame that starts at absolute sample `position`; returns True once the utterance is over"""
+        rms = float(np.sqrt(np.mean(frame.astype(np.float32) ** 2))) if len(frame) else 0.0
+        if self._calibrated < self.calibration_samples:
+            self._calibrated += len(frame)
+            if rms <= self.max_noise_rms:
+                self._noise_samples += len(frame)
+                self.noise_floor += (rms - self.noise_floor) * len(frame) / self._noise_samples
+                return False
+        is_speech = rms > max(self.min_rms, self.noise_floor * self.speech_ratio)
+
+        if is_speech:
+            self._speech_run += len(frame)
+            self._silence_run = 0
+            if not self.speech_started and self._speech_run >= self.min_speech_samples:
+                self.speech_started = True
+                self.speech_start = position + len(frame) - self._speech_run
+        else:
+            self._speech_run = 0
+            self._silence_run += len(frame)
+            self.noise_floor = min(self.max_noise_rms, self.noise_floor + self.noise_adaptation * (rms - self.noise_floor))
+
+        return self.speech_started and self._silence_run >= self.silence_samples
+
+
+class PyAudioSource:
+    """Microphone input through PyAudio, using the first device with input channels"""
+
+    def __init__(self, sample_rate=16000, chunk=1024):
+        self.sample_rate = sample_rate
+        self.chunk = chunk
+        self._audio = None
+        self._stream = None
+
+    def __enter__(self):
+        import pyaudio
+        self._audio = pyaudio.PyAudio()
+        device_index = None
+        for i in range(self._audio.get_device_count()):
+            if self._audio.get_device_info_by_index(i)['maxInputChannels'] > 0:
+                device_index = i
+                break
+        if device_index is None:
+            self._audio.terminate()
+            raise OSError("No input device found")
+        self._stream = self._audio.open(format=pyaudio.paInt16,
+                                        channels=1,
+                                        rate=self.sample_rate,
+                                        input=True,
+                                        input_device_index=device_index,
+                                        frames_per_buffer=self.chunk)
+        return self
+
+    def read(self):
+        data = self._stream.read(self.chunk, exception_on_overflow=False)
+        return np.frombuffer(data, dtype=np.int16)
+
+    def __exit__(self, *exc):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._audio.terminate()
+
+
+class WavFileSource:
+    """Reads 16-bit PCM from a WAV file in chunks, mixing down to mono; a drop-in for PyAudioSource"""
+
+    def __init__(self, path, chunk=1024, realtime=False):
+        self.path = path
+        self.chunk = chunk
+        self.realtime = realtime
+        self._wav = None
+
+    def __enter__(self):
+        self._wav = wave.open(self.path, "rb")
+        if self._wav.getsampwidth() != 2:
+            raise ValueError(f"{self.path} is not 16-bit PCM")
+        self.sample_rate = self._wav.getframerate()
+        self._channels = self._wav.getnchannels()
+        return self
+
+    def read(self):
+        data = self._wav.readframes(self.chunk)
+        if not data:
+            return None
+        samples = np.frombuffer(data, dtype=np.int16)
+        if self._channels > 1:
+            samples = samples.reshape(-1, self._channels).mean(axis=1).astype(np.int16)
+        if self.realtime:
+            time.sleep(len(samples) / self.sample_rate)
+        return samples
+
+    def __exit__(self, *exc):
+        self._wav.close()
+
+
+class AudioCapture:
+    """Records one utterance from a source into a ring buffer and stops on trailing silence"""
+
+    def __init__(self, source, max_seconds=30, timeout=60, pre_roll_seconds=0.3, vad_options=None):
+        self.source = source
+        self.max_seconds = max_seconds
+        self.timeout = timeout
+        self.pre_roll_seconds = pre_roll_seconds
+        self.vad_options = vad_options or {}
+
+    def record(self, stop_event=None):
+        """Return (samples, sample_rate) for the captured utterance, or (None, None) if no speech was heard"""
+        start_time = time.time()
+        with self.source as source:
+            sample_rate = source.sample_rate
+            ring = RingBuffer(int(self.max_seconds * sample_rate))
+            vad = EnergyVAD(sample_rate, **self.vad_options)
+
+            while time.time() - start_time < self.timeout:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                frame = source.read()
+                if frame is None:
+                    break
+                position = ring.written
+                ring.write(frame)
+                if vad.update(frame, position):
+                    break
+                # Once speech has filled the buffer, stop rather than lose its beginning
+                if vad.speech_started and ring.written - vad.speech_start >= ring.capacity:
+                    break
+
+        print(f"Recording duration: {time.time() - start_time:.2f} seconds")
+        if not vad.speech_started:
+            return None, None
+        return ring.read(vad.speech_start - int(self.pre_roll_seconds * sample_rate)), sample_rate
+
+
+def to_wav_bytes(samples, sample_rate):
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples.astype(np.int16).tobytes())
+    return buffer.getvalue()
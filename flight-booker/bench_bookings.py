@@ -0,0 +1,55 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bookings import BookingLedger
+
+# Usage: python bench_bookings.py [sessions] [bookings_per_session]
+SESSIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+BOOKINGS_PER_SESSION = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+DESTINATIONS = [f"City {i}" for i in range(20)]
+SEATS = SESSIONS * BOOKINGS_PER_SESSION // (len(DESTINATIONS) * 2)  # oversubscribed on purpose
+RETRY_RATE = 0.1
+
+def session(ledger, session_id):
+    rng = random.Random(session_id)
+    outcomes = {}
+    for n in range(BOOKINGS_PER_SESSION):
+        key = f"{session_id}:{n}"
+        destination = rng.choice(DESTINATIONS)
+        result = ledger.book(destination, key)
+        outcomes[result["status"]] = outcomes.get(result["status"], 0) + 1
+        # Simulate the model retrying a tool call with the same idempotency key
+        if rng.random() < RETRY_RATE:
+            retry = ledger.book(destination, key)
+            outcomes[f"retry_{retry['status']}"] = outcomes.get(f"retry_{retry['status']}", 0) + 1
+    return outcomes
+
+with tempfile.TemporaryDirectory() as directory:
+    ledger = BookingLedger(os.path.join(directory, "bookings.db"))
+    ledger.stock({destination: SEATS for destination in DESTINATIONS})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SESSIONS) as executor:
+        results = list(executor.map(lambda i: session(ledger, i), range(SESSIONS)))
+    elapsed = time.perf_counter() - start
+
+    totals = {}
+    for outcomes in results:
+        for status, count in outcomes.items():
+            totals[status] = totals.get(status, 0) + count
+    requests = sum(totals.values())
+    seats_left = sum(ledger.seats_left(destination) for destination in DESTINATIONS)
+    ledger.close()
+
+print(f"{SESSIONS} sessions, {requests} booking requests in {elapsed:.2f} seconds: {requests / elapsed:,.0f} requests/second")
+print(f"Outcomes: {totals}")
+
+# Every seat is either still free or booked exactly once, and retries never booked twice
+booked = totals.get("booked", 0)
+assert seats_left >= 0, "inventory went negative"
+assert booked + seats_left == SEATS * len(DESTINATIONS), "seat count does not add up"
+assert "retry_booked" not in totals, "a retried key booked a second seat"
+print(f"Consistent: {booked} booked + {seats_left} left = {SEATS * len(DESTINATIONS)} seats")
@@ -0,0 +1,48 @@
+import random
+import string
+import sys
+import time
+from fares import FareStore
+
+# Usage: python bench_fares.py [routes] [cities]
+ROUTES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+CITIES = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+LOOKUPS = 20_000
+
+random.seed(7)
+
+def random_city():
+    return "".join(random.choices(string.ascii_lowercase, k=random.randint(5, 12))).title()
+
+def misspell(city):
+    i = random.randrange(len(city))
+    return city[:i] + random.choice(string.ascii_lowercase) + city[i + 1:]
+
+def timed(label, queries, lookup):
+    start = time.perf_counter()
+    found = sum(1 for query in queries if lookup(*query) is not None)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed / len(queries) * 1e6:8.2f} us/lookup  ({found}/{len(queries)} found)")
+
+cities = list({random_city() for _ in range(CITIES)})
+pairs = set()
+while len(pairs) < ROUTES:
+    origin, destination = random.sample(cities, 2)
+    pairs.add((origin, destination))
+routes = [(o, d, round(random.uniform(80, 2500), 2), random.choice(["USD", "EUR", "GBP"])) for o, d in pairs]
+
+start = time.perf_counter()
+store = FareStore(routes)
+print(f"Loaded {len(store)} routes between {len(cities)} cities in {time.perf_counter() - start:.2f} seconds")
+
+sample = random.choices(routes, k=LOOKUPS)
+timed("exact origin/destination", [(d, o) for o, d, _, _ in sample], store.lookup)
+timed("cheapest into destination", [(d,) for _, d, _, _ in sample], store.lookup)
+timed("prefix destination", [(d[:-1].lower(),) for _, d, _, _ in sample], store.lookup)
+
+# The cold pass bypasses the memo so every query pays for the deletion-index search
+fuzzy = [(misspell(d),) for _, d, _, _ in random.choices(routes, k=2_000)]
+timed("fuzzy destination (cold)", fuzzy, lambda city: store._resolve_city(city))
+for query in fuzzy:
+    store.resolve_city(*query)
+timed("fuzzy destination (memoized)", fuzzy, store.lookup)
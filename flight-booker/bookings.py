@@ -0,0 +1,167 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory (
+    destination TEXT PRIMARY KEY,
+    seats INTEGER NOT NULL CHECK (seats >= 0)
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT UNIQUE,
+    destination TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class BookingLedger:
+    """SQLite (WAL) booking ledger with seat inventory.
+
+    All writes go through one writer thread that drains the request queue and commits each
+    batch in a single transaction, so concurrent sessions pay for one fsync per batch rather
+    than one per booking. Seat decrements are conditional updates, so the count can never go
+    below zero, and a repeated idempotency key returns the original booking instead of a new one.
+    """
+
+    def __init__(self, path, batch_size=128, batch_wait=0.002, result_timeout=60):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.result_timeout = result_timeout
+        self._requests = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._readers = threading.local()
+
+        connection = self._connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _submit(self, operation, *args):
+        future = Future()
+        # Checked under the lock close() takes, so nothing can be queued behind the shutdown marker
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("The booking ledger is closed")
+            self._requests.put((operation, args, future))
+        return future.result(timeout=self.result_timeout)
+
+    def stock(self, seats_by_destination, replace=False):
+        """Add destinations with their seat counts; existing counts are kept unless replace is set"""
+        return self._submit(self._stock, dict(seats_by_destination), replace)
+
+    def book(self, destination, idempotency_key=None):
+        return self._submit(self._book, destination, idempotency_key)
+
+    def seats_left(self, destination):
+        # Readers get their own connection per thread; WAL lets them run alongside the writer
+        connection = getattr(self._readers, "connection", None)
+        if connection is None:
+            connection = self._readers.connection = self._connect()
+        row = connection.execute("SELECT seats FROM inventory WHERE destination = ?", (destination,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._requests.put(None)
+        self._writer.join()
+
+    def _stock(self, connection, seats_by_destination, replace):
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        connection.executemany(
+            f"{verb} INTO inventory (destination, seats) VALUES (?, ?)",
+            seats_by_destination.items()
+        )
+        return len(seats_by_destination)
+
+    def _book(self, connection, destination, idempotency_key):
+        if idempotency_key is not None:
+            row = connection.execute(
+                "SELECT id, destination FROM bookings WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+            if row:
+                return {"status": "duplicate", "booking_id": row[0], "destination": row[1]}
+
+        updated = connection.execute(
+            "UPDATE inventory SET seats = seats - 1 WHERE destination = ? AND seats > 0", (destination,)
+        ).rowcount
+        if not updated:
+            exists = connection.execute("SELECT 1 FROM inventory WHERE destination = ?", (destination,)).fetchone()
+            return {"status": "sold_out" if exists else "unknown_destination", "destination": destination}
+
+        booking_id = connection.execute(
+            "INSERT INTO bookings (idempotency_key, destination, created_at) VALUES (?, ?, ?)",
+            (idempotency_key, destination, time.time())
+        ).lastrowid
+        return {"status": "booked", "booking_id": booking_id, "destination": destination}
+
+    def _next_batch(self):
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            try:
+                batch.append(self._requests.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, connection, batch):
+        results = []
+        connection.execute("BEGIN IMMEDIATE")
+        for i, (operation, args, future) in enumerate(batch):
+            # A savepoint per request keeps one failure from rolling back the rest of the batch
+            connection.execute(f"SAVEPOINT request_{i}")
+            try:
+                results.append((future, operation(connection, *args), None))
+                connection.execute(f"RELEASE request_{i}")
+            except Exception as e:
+                connection.execute(f"ROLLBACK TO request_{i}")
+                connection.execute(f"RELEASE request_{i}")
+                results.append((future, None, e))
+        connection.execute("COMMIT")
+        return results
+
+    def _write_loop(self):
+        connection = self._connect()
+        running = True
+        while running:
+            batch = self._next_batch()
+            if batch[-1] is None:
+                batch.pop()
+                running = False
+
+            try:
+                results = self._write_batch(connection, batch)
+            except Exception as e:
+                # e.g. "database is locked" while another process holds the write lock; this batch
+                # fails, and the writer stays up for the next one
+                if connection.in_transaction:
+                    try:
+                        connection.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        pass
+                results = [(future, None, e) for _, _, future in batch]
+
+            # Callers only hear back once their booking is durable
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+        connection.close()
@@ -0,0 +1,235 @@
+import array
+import bisect
+import csv
+import sqlite3
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+
+# Shorter queries are more likely to be a different city than a typo, so they get less slack
+MIN_PREFIX_LENGTH = 3
+
+
+def normalize_city(city):
+    # Fold accents, case and whitespace so "São Paulo", "sao paulo" and " Sao  Paulo" are one key
+    city = unicodedata.normalize("NFKD", city or "")
+    city = "".join(c for c in city if not unicodedata.combining(c))
+    return " ".join(city.lower().split())
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """Levenshtein distance, or max_distance + 1 as soon as the distance is known to exceed it"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def allowed_edit_distance(length, max_distance):
+    """Typos tolerated in a query of this length: none up to 4 characters, 1 up to 8, then 2"""
+    if length <= 4:
+        return 0
+    return min(1 if length <= 8 else 2, max_distance)
+
+
+def deletion_variants(word, max_distance):
+    """Every string reachable from word by deleting up to max_distance characters"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+class FareStore:
+    """Route fares held in compact typed arrays, with exact, prefix and fuzzy city matching.
+
+    Each route is stored once as a sorted (origin id, destination id) key next to its price and
+    currency id. An empty origin means the fare applies from any origin. Fuzzy matching uses a
+    deletion index: two names within edit distance k share a variant with up to k deletions, so
+    only a handful of candidates need an exact distance check.
+    """
+
+    def __init__(self, routes, max_edit_distance=2):
+        self.max_edit_distance = max_edit_distance
+        self._names = []          # city id -> display name
+        self._city_ids = {}       # normalized name -> city id
+        self._currencies = []     # currency id -> code
+        self._currency_ids = {}
+
+        rows = []
+        for origin, destination, price, currency in routes:
+            rows.append((
+                self._city_id(origin),
+                self._city_id(destination),
+                float(price),
+                self._currency_id(currency or "USD")
+            ))
+
+        self._stride = max(len(self._names), 1)
+        rows.sort(key=lambda row: row[0] * self._stride + row[1])
+        self._keys = array.array("q", (o * self._stride + d for o, d, _, _ in rows))
+        self._prices = array.array("d", (price for _, _, price, _ in rows))
+        self._currency_of = array.array("B", (currency for _, _, _, currency in rows))
+
+        # Cheapest fare into every destination, for lookups without an origin
+        self._cheapest = array.array("q", [-1]) * len(self._names)
+        self._route_counts = array.array("I", [0]) * len(self._names)
+        for row, (_, destination, price, _) in enumerate(rows):
+            self._route_counts[destination] += 1
+            best = self._cheapest[destination]
+            if best < 0 or price < self._prices[best]:
+                self._cheapest[destination] = row
+
+        self._sorted_names = sorted(name for name in self._city_ids if name)
+        self._deletions = defaultdict(list)
+        for name in self._sorted_names:
+            for variant in deletion_variants(name, max_edit_distance):
+                self._deletions[variant].append(name)
+
+        # The model tends to ask about the same few cities, so resolved spellings are memoized
+        self.resolve_city = lru_cache(maxsize=4096)(self._resolve_city)
+
+    def _city_id(self, city):
+        key = normalize_city(city)
+        if key not in self._city_ids:
+            self._city_ids[key] = len(self._names)
+            self._names.append((city or "").strip())
+        return self._city_ids[key]
+
+    def _currency_id(self, currency):
+        code = currency.strip().upper()
+        if code not in self._currency_ids:
+            self._currency_ids[code] = len(self._currencies)
+            self._currencies.append(code)
+        return self._currency_ids[code]
+
+    @classmethod
+    def from_csv(cls, path):
+        """Load a CSV with origin, destination, price and currency columns"""
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            return cls(
+                (row.get("origin", ""), row["destination"], row["price"], row.get("currency"))
+                for row in reader
+            )
+
+    @classmethod
+    def from_sqlite(cls, path, table="fares"):
+        """Load a SQLite table with origin, destination, price and currency columns"""
+        connection = sqlite3.connect(path)
+        try:
+            return cls(connection.execute(f"SELECT origin, destination, price, currency FROM {table}").fetchall())
+        finally:
+            connection.close()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def destinations(self):
+        return [self._names[i] for i in range(len(self._names)) if self._route_counts[i]]
+
+    def popular_destinations(self, limit):
+        ranked = sorted(range(len(self._names)), key=lambda i: self._route_counts[i], reverse=True)
+        return [self._names[i] for i in ranked[:limit] if self._route_counts[i]]
+
+    def _resolve_city(self, city):
+        """Return the known city id for an exact, unique prefix or closest fuzzy match, else None"""
+        key = normalize_city(city)
+        if not key:
+            return None
+        if key in self._city_ids:
+            return self._city_ids[key]
+        if len(key) < MIN_PREFIX_LENGTH:
+            return None
+
+        start = bisect.bisect_left(self._sorted_names, key)
+        matches = []
+        for name in self._sorted_names[start:start + 2]:
+            if name.startswith(key):
+                matches.append(name)
+        if len(matches) == 1:
+            return self._city_ids[matches[0]]
+
+        max_distance = allowed_edit_distance(len(key), self.max_edit_distance)
+        if max_distance == 0:
+            return None
+        candidates = set()
+        for variant in deletion_variants(key, max_distance):
+            candidates.update(self._deletions.get(variant, ()))
+
+        best, best_distance, ties = None, max_distance + 1, 0
+        for name in candidates:
+            distance = bounded_edit_distance(key, name, max_distance)
+            if distance < best_distance:
+                best, best_distance, ties = name, distance, 1
+            elif distance == best_distance:
+                ties += 1
+        # Ambiguous spellings resolve to nothing rather than to an arbitrary city
+        return self._city_ids[best] if best is not None and ties == 1 else None
+
+    def exact_city(self, city):
+        """The known city's display name when city names it exactly, up to case, accents and spacing"""
+        city_id = self._city_ids.get(normalize_city(city))
+        return self._names[city_id] if city_id is not None and self._route_counts[city_id] else None
+
+    def suggest(self, city, limit=3):
+        """Destinations the customer may have meant, closest first; looser than resolve_city"""
+        key = normalize_city(city)
+        if not key:
+            return []
+        distances = {}
+        start = bisect.bisect_left(self._sorted_names, key)
+        for name in self._sorted_names[start:start + limit]:
+            if name.startswith(key):
+                distances[name] = 0
+        for variant in deletion_variants(key, self.max_edit_distance):
+            for name in self._deletions.get(variant, ()):
+                if name not in distances:
+                    distance = bounded_edit_distance(key, name, self.max_edit_distance)
+                    if distance <= self.max_edit_distance:
+                        distances[name] = distance
+        ranked = sorted(distances, key=lambda name: (distances[name], name))
+        names = [self._names[self._city_ids[name]] for name in ranked if self._route_counts[self._city_ids[name]]]
+        return names[:limit]
+
+    def _fare(self, row):
+        origin, destination = divmod(self._keys[row], self._stride)
+        return {
+            "origin": self._names[origin] or None,
+            "destination": self._names[destination],
+            "price": self._prices[row],
+            "currency": self._currencies[self._currency_of[row]]
+        }
+
+    def lookup(self, destination, origin=None):
+        """Fare for the route, or the cheapest fare into destination when origin is not given"""
+        destination_id = self.resolve_city(destination)
+        if destination_id is None:
+            return None
+        if not origin:
+            row = self._cheapest[destination_id]
+            return self._fare(row) if row >= 0 else None
+
+        # Fares from a specific origin win over "any origin" fares, which also cover origins we don't know
+        origin_id = self.resolve_city(origin)
+        for candidate in (origin_id, self._city_ids.get("")):
+            if candidate is None:
+                continue
+            key = candidate * self._stride + destination_id
+            row = bisect.bisect_left(self._keys, key)
+            if row < len(self._keys) and self._keys[row] == key:
+                return self._fare(row)
+        return None
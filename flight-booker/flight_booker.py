@@ -1,18 +1,20 @@
 import os
 import json
-import pyaudio
-import scipy.io.wavfile as wavfile
-import numpy as np
 import threading
-import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from openai import OpenAI
 import gradio as gr
 import base64
+import hashlib
+import uuid
 from io import BytesIO
 from PIL import Image
-from pydub import AudioSegment
-from pydub.playback import play
+from image_cache import ImageCache
+from speech import Talker
+from fares import FareStore, normalize_city
+from bookings import BookingLedger
+from audio_capture import AudioCapture, PyAudioSource, to_wav_bytes
 
 load_dotenv()
 
@@ -28,12 +30,13 @@ system_message = "You are a helpful assistant for an Airline called FlightAI. "
 system_message += "Give short, courteous answers, no more than 1 sentence. "
 system_message += "Always be accurate. If you don't know the answer, say so."
 
-ticket_prices = { "london": "$799", "paris": "$899", "tokyo": "$1400", "berlin": "$499" }
+fares_path = os.getenv("FARES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fares.csv"))
+fare_store = FareStore.from_sqlite(fares_path) if fares_path.endswith((".db", ".sqlite")) else FareStore.from_csv(fares_path)
+print(f"Loaded {len(fare_store)} fares from {fares_path}")
 
-def get_ticket_price(destination_city):
+def get_ticket_price(destination_city, origin_city=None):
     print(f"Tool get_ticket_price called for {destination_city}")
-    city = destination_city.lower()
-    return ticket_prices.get(city, "Unknown")
+    return fare_store.lookup(destination_city, origin_city)
 
 price_function = {
     "name": "get_ticket_price",
@@ -45,18 +48,36 @@ price_function = {
                 "type": "string",
                 "description": "The city that the customer wants to travel to",
             },
+            "origin_city": {
+                "type": "string",
+                "description": "The city the customer is flying from, if they said so",
+            },
         },
         "required": ["destination_city"],
         "additionalProperties": False
     }
 }
 
-def book_ticket(destination_city):
-    print(f"Return ticket booked to {destination_city}")
+ledger = BookingLedger(os.getenv("BOOKINGS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bookings.db")))
+ledger.stock({destination: int(os.getenv("SEATS_PER_DESTINATION", "100")) for destination in fare_store.destinations()})
+
+def book_ticket(destination_city, turn_id=None):
+    # Only an exact city is booked; a near miss comes back for the customer to confirm first
+    destination = fare_store.exact_city(destination_city)
+    if destination is None:
+        suggestions = fare_store.suggest(destination_city)
+        if suggestions:
+            return {"status": "ambiguous", "destination": destination_city, "did_you_mean": suggestions}
+        return {"status": "unknown_destination", "destination": destination_city}
+    # Booking the same city again within one user turn is a retry, not a second ticket
+    idempotency_key = f"{turn_id}:{normalize_city(destination)}" if turn_id else None
+    result = ledger.book(destination, idempotency_key)
+    print(f"Return ticket to {destination}: {result['status']}")
+    return result
 
 book_function = {
     "name": "book_ticket",
-    "description": "Book a return ticket to the destination city. Call this whenever you want to book a ticket, for example when a customer confirms their intent to buy a ticket after knowing the ticket price.",
+    "description": "Book a return ticket to the destination city. Call this whenever you want to book a ticket, for example when a customer confirms their intent to buy a ticket after knowing the ticket price. If the result is ambiguous, ask the customer which of the did_you_mean cities they meant before booking again.",
     "parameters": {
         "type": "object",
         "properties": {
@@ -72,34 +93,84 @@ book_function = {
 
 tools = [{"type": "function", "function": price_function}, {"type": "function", "function": book_function}]
 
-def handle_tool_call(message):
-    tool_call = message.tool_calls[0]
-    selected_function = tool_call.function.name
-    arguments = json.loads(tool_call.function.arguments)
+def price_tool(arguments, turn_id):
     city = arguments.get("destination_city")
-    if selected_function == "get_ticket_price":
-        print(f'Calling get_ticket_price for {city}')
-        price = get_ticket_price(city)
-        response = {
-            "role": "tool",
-            "content": json.dumps({"destination_city": city, "price": price}),
-            "tool_call_id": tool_call.id
-        }
+    print(f'Calling get_ticket_price for {city}')
+    fare = get_ticket_price(city, arguments.get("origin_city"))
+    if fare is None:
+        return json.dumps({"destination_city": city, "price": "Unknown"}), None
+    content = json.dumps({
+        "origin_city": fare["origin"],
+        "destination_city": fare["destination"],
+        "price": fare["price"],
+        "currency": fare["currency"]
+    })
+    return content, fare["destination"]
+
+def book_tool(arguments, turn_id):
+    city = arguments.get("destination_city")
+    print(f'Calling book_ticket for {city}')
+    result = book_ticket(city, turn_id)
+    known = result["status"] in ("booked", "duplicate", "sold_out")
+    return json.dumps(result), result["destination"] if known else None
+
+# Each handler returns the tool result and the resolved destination to illustrate, if any
+tool_handlers = {
+    "get_ticket_price": price_tool,
+    "book_ticket": book_tool
+}
+
+MAX_TOOL_ROUNDS = 5
+tool_executor = ThreadPoolExecutor(max_workers=8)
+
+def run_tool_call(tool_call, turn_id):
+    selected_function = tool_call.function.name
+    city = None
+    handler = tool_handlers.get(selected_function)
+    if handler is None:
+        content = json.dumps({"error": f"Unknown tool {selected_function}"})
     else:
-        print(f'Calling book_ticket for {city}')
-        book_ticket(city)
-        response = {
-            "role": "tool",
-            "content": f"Return ticket booked to {city}",
-            "tool_call_id": tool_call.id
-        }
+        try:
+            # Malformed arguments go back to the model as an error like any other tool failure
+            parsed = json.loads(tool_call.function.arguments)
+            if not isinstance(parsed, dict):
+                raise ValueError("Tool arguments must be a JSON object")
+            content, city = handler(parsed, turn_id)
+        except Exception as e:
+            print(f"Tool {selected_function} failed: {e}")
+            content = json.dumps({"error": str(e)})
+    response = {
+        "role": "tool",
+        "content": content,
+        "tool_call_id": tool_call.id
+    }
+    # The canonical city, so misspellings share the pre-warmed image instead of generating their own
     return response, city
 
-def artist(city):
+def handle_tool_call(message, turn_id):
+    # Every tool call in the response runs concurrently; results keep the order of the calls
+    results = list(tool_executor.map(lambda tool_call: run_tool_call(tool_call, turn_id), message.tool_calls))
+    responses = [response for response, _ in results]
+    cities = [city for _, city in results if city]
+    return responses, cities
+
+ARTIST_MODEL = "dall-e-3"
+ARTIST_SIZE = "1024x1024"
+ARTIST_PROMPT = "An image representing a vacation in {city}, showing tourist spots and everything unique about {city}, in a vibrant pop-art style"
+
+# Changing the model, size or prompt changes the version, so stale images are never served
+artist_prompt_version = hashlib.sha256(f"{ARTIST_MODEL}|{ARTIST_SIZE}|{ARTIST_PROMPT}".encode()).hexdigest()[:12]
+image_cache = ImageCache(
+    os.getenv("IMAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".image_cache")),
+    prompt_version=artist_prompt_version,
+    max_bytes=int(os.getenv("IMAGE_CACHE_MAX_MB", "100")) * 1024 * 1024
+)
+
+def generate_image(city):
     image_response = openai.images.generate(
-            model="dall-e-3",
-            prompt=f"An image representing a vacation in {city}, showing tourist spots and everything unique about {city}, in a vibrant pop-art style",
-            size="1024x1024",
+            model=ARTIST_MODEL,
+            prompt=ARTIST_PROMPT.format(city=city),
+            size=ARTIST_SIZE,
             n=1,
             response_format="b64_json"
     )
@@ -107,116 +178,85 @@ def artist(city):
     image_data = base64.b64decode(image_base64)
     return Image.open(BytesIO(image_data))
 
+def artist(city):
+    return image_cache.get_or_create(city, generate_image)
+
+speech = Talker(
+    openai,
+    model="tts-1",
+    voice="onyx",
+    cache_dir=os.getenv("AUDIO_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".audio_cache"))
+)
+
 def talker(message):
-    response = openai.audio.speech.create(
-            model="tts-1",
-            voice="onyx",
-            input=message
-    )
+    speech.speak(message)
+
+# Image generation runs next to the follow-up completion; audio gets its own
+# single worker so replies are spoken one at a time and in order
+image_executor = ThreadPoolExecutor(max_workers=2)
+audio_executor = ThreadPoolExecutor(max_workers=1)
 
-    audio_stream = BytesIO(response.content)
-    audio = AudioSegment.from_file(audio_stream, format="mp3")
-    play(audio)
+def report_background_error(future):
+    error = future.exception()
+    if error:
+        print(f"Background task failed: {error}")
+
+def speak(message):
+    audio_executor.submit(talker, message).add_done_callback(report_background_error)
 
 def chat(history):
     messages = [{"role": "system", "content": system_message}] + history
+    # Tool calls repeated while answering this turn share idempotency keys
+    turn_id = uuid.uuid4().hex
     response = openai.chat.completions.create(model="gpt-4o-mini", messages=messages, tools=tools)
-    image = None
+    image_future = None
+    image_city = None
+    rounds = 0
 
-    if response.choices[0].finish_reason == "tool_calls":
+    while response.choices[0].finish_reason == "tool_calls":
+        rounds += 1
         message = response.choices[0].message
-        response, city = handle_tool_call(message)
+        responses, cities = handle_tool_call(message, turn_id)
         messages.append(message)
-        messages.append(response)
-        image = artist(city)
-        response = openai.chat.completions.create(model="gpt-4o-mini", messages=messages)
+        messages.extend(responses)
+        if cities and cities[-1] != image_city:
+            image_city = cities[-1]
+            image_future = image_executor.submit(artist, image_city)
+        # Once the round limit is reached the tools are withheld, so the model has to answer
+        round_tools = {"tools": tools} if rounds < MAX_TOOL_ROUNDS else {}
+        response = openai.chat.completions.create(model="gpt-4o-mini", messages=messages, **round_tools)
 
     reply = response.choices[0].message.content
     history += [{"role":"assistant", "content": reply}]
 
-    talker(reply)
+    speak(reply)
+
+    if image_future is None:
+        yield history, None
+        return
 
-    return history, image
+    # Show the text right away and push the image once it is ready
+    yield history, gr.update()
+    try:
+        image = image_future.result()
+    except Exception as e:
+        print(f"Image generation failed: {e}")
+        return
+    yield history, image
 
-# Global variables for audio recording
-recording = False
-audio_data = None
 stop_recording = threading.Event()
-start_time = None
-
-def get_input_device():
-    p = pyaudio.PyAudio()
-    device_index = None
-
-    for i in range(p.get_device_count()):
-        device_info = p.get_device_info_by_index(i)
-        print(f"Device {i}: {device_info['name']}")
-        if device_info['maxInputChannels'] > 0:
-            device_index = i
-            break
-
-    p.terminate()
-    return device_index
-
-def listen_audio(timeout=10):
-    global recording, audio_data, stop_recording, start_time
-
-    device_index = get_input_device()
-    if device_index is None:
-        print("No input device found")
-        return None, None
-    
-    # Reset global variables
-    recording = True
+
+def transcribe(samples, sample_rate):
+    transcription = openai.audio.transcriptions.create(
+            model="whisper-1",
+            file=("speech.wav", to_wav_bytes(samples, sample_rate))
+    )
+    return transcription.text.strip()
+
+def listen_audio(source=None, timeout=30):
     stop_recording.clear()
-    audio_data = []
-    start_time = time.time()
-    
-    # Set sample rate and channels
-    sample_rate = 44100
-    chunk = 1024
-    
-    p = pyaudio.PyAudio()
-    stream = p.open(format=pyaudio.paInt16,
-                    channels=1,
-                    rate=sample_rate,
-                    input=True,
-                    input_device_index=device_index,
-                    frames_per_buffer=chunk)
-
-    while recording and (time.time() - start_time) < timeout:
-        if stop_recording.is_set():
-            break
-        data = stream.read(chunk, exception_on_overflow=False)
-        audio_data.append(data)
-
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
-    
-    # Stop recording
-    recording = False
-
-    duration = time.time() - start_time
-    print(f"Recording duration: {duration:.2f} seconds")
-    
-    if audio_data:
-        play_recorded_audio(audio_data, sample_rate)
-        return audio_array, sample_rate
-    
-    return None, None
-
-def play_recorded_audio(audio_frames, sample_rate):
-    buffer = BytesIO()
-    with wave.open(buffer, 'wb') as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(sample_rate)
-        wf.writeframes(b''.join(audio_frames))
-
-    buffer.seek(0)
-    audio = AudioSegment.from_file(buffer)
-    play(audio)
+    capture = AudioCapture(source or PyAudioSource(), timeout=timeout)
+    return capture.record(stop_recording)
 
 with gr.Blocks() as ui:
     with gr.Row():
@@ -226,6 +266,7 @@ with gr.Blocks() as ui:
         entry = gr.Textbox(label="Chat with our AI Assistant:")
     with gr.Row():
         audio_button = gr.Button("Start Audio")
+        stop_audio_button = gr.Button("Stop Audio")
     with gr.Row():
         clear = gr.Button("Clear")
 
@@ -233,24 +274,30 @@ with gr.Blocks() as ui:
         history += [{"role":"user", "content": message}]
         return "", history
 
-    def toggle_recording():
-        global recording, stop_recording
-        if recording:
-            stop_recording.set()
-            return "Start Audio"
-        else:
-            threading.Thread(target=listen_audio, daemon=True).start()
-            return "Finish Audio"
-
-    # Update the button interaction
-    audio_button.click(
-        toggle_recording, 
-        outputs=audio_button
+    def do_audio_entry(history):
+        try:
+            samples, sample_rate = listen_audio()
+        except OSError as e:
+            raise gr.Error(str(e))
+        if samples is None:
+            raise gr.Error("No speech detected, please try again.")
+        message = transcribe(samples, sample_rate)
+        if not message:
+            raise gr.Error("Could not understand the recording, please try again.")
+        history += [{"role":"user", "content": message}]
+        return history
+
+    # Recording stops on its own after trailing silence; the stop button ends it early
+    audio_button.click(do_audio_entry, inputs=chatbot, outputs=chatbot).success(
+        chat, inputs=chatbot, outputs=[chatbot, image_output]
     )
+    stop_audio_button.click(lambda: stop_recording.set(), queue=False)
 
     entry.submit(do_entry, inputs=[entry, chatbot], outputs=[entry, chatbot]).then(
         chat, inputs=chatbot, outputs=[chatbot, image_output]
     )
     clear.click(lambda: None, inputs=None, outputs=chatbot, queue=False)
 
+image_cache.prewarm(fare_store.popular_destinations(int(os.getenv("IMAGE_PREWARM_LIMIT", "20"))), generate_image)
+
 ui.launch(inbrowser=True)
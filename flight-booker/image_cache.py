@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from PIL import Image
+from fares import normalize_city
+
+
+class ImageCache:
+    """Disk-backed, size-bounded LRU cache of generated images, stored as WebP"""
+
+    def __init__(self, directory, prompt_version, max_bytes=100 * 1024 * 1024, quality=85):
+        self.directory = directory
+        self.prompt_version = prompt_version
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # file name -> size in bytes, least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".webp"):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._size += size
+
+    def _file_name(self, city):
+        key = f"{self.prompt_version}:{normalize_city(city)}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + ".webp"
+
+    def _lock_for(self, name):
+        with self._lock:
+            return self._key_locks.setdefault(name, threading.Lock())
+
+    def _read(self, name):
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        try:
+            image = Image.open(path)
+            image.load()
+        except OSError:
+            self._discard(name)
+            return None
+        try:
+            # mtime doubles as the recency marker when the cache is reloaded; the file may have
+            # been evicted since it was read, which doesn't matter once the image is in memory
+            os.utime(path)
+        except OSError:
+            pass
+        return image
+
+    def get(self, city):
+        image = self._read(self._file_name(city))
+        with self._lock:
+            if image is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return image
+
+    def put(self, city, image):
+        name = self._file_name(city)
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, format="WEBP", quality=self.quality)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._size += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._evict()
+
+    def _discard(self, name):
+        with self._lock:
+            self._size -= self._entries.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def get_or_create(self, city, generate):
+        image = self.get(city)
+        if image is not None:
+            return image
+        # One generation per city at a time, so a chat turn and the pre-warm job don't both pay for it
+        name = self._file_name(city)
+        with self._lock_for(name):
+            image = self._read(name)
+            if image is None:
+                image = generate(city)
+                self.put(city, image)
+            return image
+
+    def prewarm(self, cities, generate):
+        def run():
+            start = time.time()
+            for city in cities:
+                try:
+                    self.get_or_create(city, generate)
+                except Exception as e:
+                    print(f"Pre-warming image for {city} failed: {e}")
+            print(f"Image cache pre-warmed for {len(cities)} cities in {time.time() - start:.1f} seconds")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
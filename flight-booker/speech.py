@@ -0,0 +1,155 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import pyaudio
+
+# tts-1 "pcm" output is raw 24kHz, 16-bit signed, mono samples, so it can be played as it arrives
+PCM_SAMPLE_RATE = 24000
+CHUNK_BYTES = 4096
+
+
+class Talker:
+    """Streams text-to-speech straight to the speakers and caches the audio of short, repeated phrases.
+
+    The cache is an LRU bounded by max_cache_bytes both in memory and in cache_dir on disk.
+    """
+
+    def __init__(self, client, model="tts-1", voice="onyx", cache_dir=None,
+                 max_cached_chars=120, max_cache_bytes=32 * 1024 * 1024):
+        self.client = client
+        self.model = model
+        self.voice = voice
+        self.cache_dir = cache_dir
+        self.max_cached_chars = max_cached_chars
+        self.max_cache_bytes = max_cache_bytes
+        self.stats = {"utterances": 0, "cache_hits": 0, "total_time_to_first_audio": 0.0}
+        self._cache = OrderedDict()  # key -> PCM bytes, least recently used first
+        self._cache_size = 0
+        self._files = OrderedDict()  # key -> size of its file in cache_dir, least recently used first
+        self._files_size = 0
+        self._lock = threading.Lock()
+        self._audio = None
+        self._stream = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_files()
+
+    def _load_files(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pcm"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                files.append((stat.st_mtime, name[:-len(".pcm")], stat.st_size))
+        for _, key, size in sorted(files):
+            self._files[key] = size
+            self._files_size += size
+        self._remove_files(self._evict_files())
+
+    def _output_stream(self):
+        # Opened once and reused; speak() is only ever called from one worker thread
+        if self._stream is None:
+            self._audio = pyaudio.PyAudio()
+            self._stream = self._audio.open(format=pyaudio.paInt16, channels=1, rate=PCM_SAMPLE_RATE, output=True)
+        return self._stream
+
+    def _key(self, message):
+        return hashlib.sha256(f"{self.model}|{self.voice}|{message}".encode("utf-8")).hexdigest()[:32]
+
+    def _cache_get(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        if self.cache_dir:
+            with self._lock:
+                if key not in self._files:
+                    return None
+                self._files.move_to_end(key)
+            path = os.path.join(self.cache_dir, f"{key}.pcm")
+            try:
+                with open(path, "rb") as f:
+                    audio = f.read()
+                # mtime is the recency marker when the cache is reloaded
+                os.utime(path)
+            except OSError:
+                return None
+            self._cache_put(key, audio, persist=False)
+            return audio
+        return None
+
+    def _cache_put(self, key, audio, persist=True):
+        with self._lock:
+            self._cache_size += len(audio) - len(self._cache.pop(key, b""))
+            self._cache[key] = audio
+            while self._cache_size > self.max_cache_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_size -= len(evicted)
+        if persist and self.cache_dir:
+            path = os.path.join(self.cache_dir, f"{key}.pcm")
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(audio)
+            os.replace(f"{path}.tmp", path)
+            with self._lock:
+                self._files_size += len(audio) - self._files.pop(key, 0)
+                self._files[key] = len(audio)
+                evicted = self._evict_files()
+            self._remove_files(evicted)
+
+    def _evict_files(self):
+        # Called with the lock held (or before other threads exist); returns the keys to delete
+        evicted = []
+        while self._files_size > self.max_cache_bytes and len(self._files) > 1:
+            key, size = self._files.popitem(last=False)
+            self._files_size -= size
+            evicted.append(key)
+        return evicted
+
+    def _remove_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(os.path.join(self.cache_dir, f"{key}.pcm"))
+            except FileNotFoundError:
+                pass
+
+    def speak(self, message):
+        start = time.perf_counter()
+        stream = self._output_stream()
+        cacheable = len(message) <= self.max_cached_chars
+        key = self._key(message)
+        audio = self._cache_get(key) if cacheable else None
+        cache_hit = audio is not None
+        time_to_first_audio = None
+
+        if cache_hit:
+            time_to_first_audio = time.perf_counter() - start
+            stream.write(audio)
+        else:
+            chunks = []
+            with self.client.audio.speech.with_streaming_response.create(
+                    model=self.model,
+                    voice=self.voice,
+                    input=message,
+                    response_format="pcm"
+            ) as response:
+                for chunk in response.iter_bytes(CHUNK_BYTES):
+                    if time_to_first_audio is None:
+                        time_to_first_audio = time.perf_counter() - start
+                    stream.write(chunk)
+                    if cacheable:
+                        chunks.append(chunk)
+            if cacheable and chunks:
+                self._cache_put(key, b"".join(chunks))
+
+        self._record(time_to_first_audio or 0.0, cache_hit, time.perf_counter() - start)
+
+    def _record(self, time_to_first_audio, cache_hit, total):
+        with self._lock:
+            self.stats["utterances"] += 1
+            self.stats["cache_hits"] += int(cache_hit)
+            self.stats["total_time_to_first_audio"] += time_to_first_audio
+            average = self.stats["total_time_to_first_audio"] / self.stats["utterances"]
+        source = "cache" if cache_hit else "stream"
+        print(f"TTS ({source}): first audio after {time_to_first_audio * 1000:.0f} ms, "
+              f"finished in {total:.2f} seconds (average first audio {average * 1000:.0f} ms)")
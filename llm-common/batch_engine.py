@@ -0,0 +1,372 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHARS_PER_TOKEN = 4
+SKIPPED_DIRS = {".git", ".hg", ".venv", "venv", "env", "__pycache__", "node_modules", "site-packages", "build", "dist"}
+FENCE_RE = re.compile(r"```(?:[\w+-]*)\n(.*?)```", re.DOTALL)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# transform -> (tool directory, tool module, output file name for a source file stem)
+TRANSFORMS = {
+    "comment": ("code-commenter", "code_commenter", "{stem}_commented.py"),
+    "tests": ("unit-test-writer", "unit_test_writer", "test_{stem}.py"),
+    "cpp": ("python-optimizer", "python_optimizer", "{stem}.cpp"),
+}
+# Requests and tokens per minute; the defaults suit a low usage tier, raise them to match yours
+DEFAULT_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 30000},
+    "anthropic": {"rpm": 50, "tpm": 40000},
+}
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def is_output(name):
+    """Files this engine writes, which must not become inputs on the next run"""
+    return name.endswith("_commented.py") or name.startswith("test_") or name.endswith("_test.py")
+
+
+def find_sources(root):
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS and not d.startswith("."))
+        for name in sorted(files):
+            if name.endswith(".py") and not is_output(name):
+                yield os.path.join(directory, name)
+
+
+def extract_code(reply):
+    """The first fenced block's contents, or the reply itself when it isn't fenced"""
+    match = FENCE_RE.search(reply)
+    return (match.group(1) if match else reply).strip() + "\n"
+
+
+class RateLimited(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Allows `rate` units per minute, in bursts of at most a minute's worth.
+
+    A bucket can run into debt when a request used more than was reserved for it; later callers
+    then wait until it is paid back. block_for() stops everyone for a while, e.g. after a 429.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waited = 0.0
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount):
+        amount = min(amount, self.capacity)
+        start = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0 and self.tokens >= amount:
+                    self.tokens -= amount
+                    self.waited += now - start
+                    return
+                if wait <= 0:
+                    wait = (amount - self.tokens) / self.rate
+                self._condition.wait(wait)
+
+    def adjust(self, amount):
+        """Charge (positive) or refund (negative) the difference once the real cost is known"""
+        with self._condition:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+            self._condition.notify_all()
+
+    def block_for(self, seconds):
+        with self._condition:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class ProviderLimiter:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def acquire(self, estimated_tokens):
+        self.requests.acquire(1)
+        self.tokens.acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens, used_tokens):
+        self.tokens.adjust(used_tokens - estimated_tokens)
+
+    def back_off(self, seconds):
+        self.requests.block_for(seconds)
+        self.tokens.block_for(seconds)
+
+    @property
+    def waited(self):
+        return self.requests.waited + self.tokens.waited
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def openai_caller(model, max_tokens):
+    import openai
+    # Retries are ours, so they go through the shared rate limiter
+    client = openai.OpenAI(max_retries=0)
+
+    def call(messages):
+        try:
+            response = client.chat.completions.create(model=model, messages=messages, max_tokens=max_tokens)
+        except (openai.APIConnectionError, openai.APITimeoutError) as e:
+            raise RateLimited(str(e))
+        except openai.APIStatusError as e:
+            if e.status_code in RETRYABLE_STATUS:
+                raise RateLimited(str(e), _retry_after(e))
+            raise
+        usage = response.usage
+        return response.choices[0].message.content or "", usage.prompt_tokens, usage.completion_tokens
+    return call
+
+
+def anthropic_caller(model, max_tokens):
+    import anthropic
+    client = anthropic.Anthropic(max_retries=0)
+
+    def call(messages):
+        try:
+            response = client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                system=messages[0]["content"],
+                messages=messages[1:],
+            )
+        except (anthropic.APIConnectionError, anthropic.APITimeoutError) as e:
+            raise RateLimited(str(e))
+        except anthropic.APIStatusError as e:
+            if e.status_code in RETRYABLE_STATUS:
+                raise RateLimited(str(e), _retry_after(e))
+            raise
+        text = "".join(block.text for block in response.content if block.type == "text")
+        return text, response.usage.input_tokens, response.usage.output_tokens
+    return call
+
+
+def load_tool(transform):
+    """The tool module behind a transform, for its prompts and model names"""
+    directory, module, _ = TRANSFORMS[transform]
+    path = os.path.join(REPO_ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(module)
+
+
+class Job:
+    def __init__(self, transform, source, root):
+        self.transform = transform
+        self.source = source
+        self.relative = os.path.relpath(source, root)
+        stem, _ = os.path.splitext(os.path.basename(source))
+        self.output = os.path.join(os.path.dirname(source), TRANSFORMS[transform][2].format(stem=stem))
+        with open(source, encoding="utf-8", errors="replace") as f:
+            self.code = f.read()
+        digest = hashlib.sha256(self.code.encode("utf-8")).hexdigest()[:16]
+        # An edited source gets a new id, so a resumed run redoes it
+        self.id = f"{transform}:{self.relative}:{digest}"
+
+
+def load_checkpoint(path):
+    """Ids of jobs that finished in an earlier run; failed ones are tried again"""
+    done = set()
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by an interrupted run
+                if record.get("status") in ("ok", "skipped"):
+                    done.add(record["job"])
+    return done
+
+
+class BatchEngine:
+    """Runs transform jobs on a thread pool, paced by per-provider request and token buckets.
+
+    Every call first reserves one request and its estimated tokens (prompt plus max_tokens) and
+    settles the difference once the usage is known. A 429, overload or connection error pauses
+    the provider for the Retry-After time, or an exponential backoff with full jitter, and then
+    retries the job. Each finished job is appended to the checkpoint file right away.
+    """
+
+    def __init__(self, callers, limiters, prompts, checkpoint, workers=8, max_tokens=2000,
+                 max_attempts=6, base_delay=1.0, max_delay=60.0, max_source_tokens=8000, overwrite=False):
+        self.callers = callers  # provider -> call(messages) returning (text, prompt tokens, completion tokens)
+        self.limiters = limiters  # provider -> ProviderLimiter
+        self.prompts = prompts  # transform -> messages_for(code)
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.max_tokens = max_tokens
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_source_tokens = max_source_tokens
+        self.overwrite = overwrite
+        self.stats = {"ok": 0, "failed": 0, "skipped": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._lock = threading.Lock()
+
+    def _record(self, job, provider, status, **fields):
+        record = {"job": job.id, "transform": job.transform, "source": job.relative, "output": job.output,
+                  "provider": provider, "status": status, **fields}
+        with self._lock:
+            self.stats[status] += 1
+            self.stats["prompt_tokens"] += fields.get("prompt_tokens", 0)
+            self.stats["completion_tokens"] += fields.get("completion_tokens", 0)
+            self.checkpoint.write(json.dumps(record) + "\n")
+            self.checkpoint.flush()
+        return record
+
+    def _backoff(self, attempt, retry_after):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0)
+
+    def run_job(self, job, provider):
+        if not job.code.strip():
+            return self._record(job, provider, "skipped", reason="empty")
+        if estimate_tokens(job.code) > self.max_source_tokens:
+            return self._record(job, provider, "skipped", reason="too large")
+        if os.path.exists(job.output) and not self.overwrite:
+            return self._record(job, provider, "skipped", reason="output exists")
+
+        messages = self.prompts[job.transform](job.code)
+        estimate = sum(estimate_tokens(message["content"]) for message in messages) + self.max_tokens
+        limiter = self.limiters[provider]
+        start = time.perf_counter()
+        for attempt in range(self.max_attempts):
+            limiter.acquire(estimate)
+            try:
+                text, prompt_tokens, completion_tokens = self.callers[provider](messages)
+            except RateLimited as e:
+                # Nothing was generated: the tokens go back, the request still counts
+                limiter.settle(estimate, 0)
+                delay = self._backoff(attempt, e.retry_after)
+                limiter.back_off(delay)
+                with self._lock:
+                    self.stats["retries"] += 1
+                continue
+            except Exception as e:
+                limiter.settle(estimate, 0)
+                return self._record(job, provider, "failed", error=repr(e), attempts=attempt + 1)
+            limiter.settle(estimate, prompt_tokens + completion_tokens)
+
+            tmp_path = f"{job.output}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(extract_code(text))
+            os.replace(tmp_path, job.output)
+            return self._record(job, provider, "ok", attempts=attempt + 1, seconds=time.perf_counter() - start,
+                                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        return self._record(job, provider, "failed", error="rate limited on every attempt", attempts=self.max_attempts)
+
+    def run(self, jobs, provider, progress=None):
+        total = len(jobs)
+        finished = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self.run_job, job, provider) for job in jobs]
+            for future in futures:
+                record = future.result()
+                finished += 1
+                if progress:
+                    progress(finished, total, record)
+        return self.stats
+
+
+def print_progress(finished, total, record):
+    detail = record.get("reason") or record.get("error") or record["output"]
+    print(f"[{finished}/{total}] {record['status']:<7} {record['source']} ({record['transform']}): {detail}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the code commenter, unit test writer or C++ optimizer over a source tree")
+    parser.add_argument("root", help="directory to walk for .py files")
+    parser.add_argument("--transform", action="append", choices=sorted(TRANSFORMS), required=True,
+                        help="repeat to queue several transforms per file")
+    parser.add_argument("--model", choices=["GPT", "Claude"], default="GPT")
+    parser.add_argument("--checkpoint", default="batch_checkpoint.jsonl", help="JSONL of finished jobs, used to resume")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rpm", type=int, help="requests per minute (default depends on the provider)")
+    parser.add_argument("--tpm", type=int, help="tokens per minute (default depends on the provider)")
+    parser.add_argument("--max-tokens", type=int, default=2000, help="completion tokens per request")
+    parser.add_argument("--max-attempts", type=int, default=6)
+    parser.add_argument("--max-source-tokens", type=int, default=8000, help="skip larger files")
+    parser.add_argument("--overwrite", action="store_true", help="replace outputs that already exist")
+    parser.add_argument("--dry-run", action="store_true", help="list the jobs that would run")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    done = load_checkpoint(args.checkpoint)
+    jobs = [Job(transform, source, root) for source in find_sources(root) for transform in args.transform]
+    pending = [job for job in jobs if job.id not in done]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(pending)} already done", file=sys.stderr)
+    if args.dry_run:
+        for job in pending:
+            print(f"{job.transform}\t{job.relative}\t{job.output}")
+        return
+
+    tools = {transform: load_tool(transform) for transform in args.transform}
+    provider = "openai" if args.model == "GPT" else "anthropic"
+    # Every tool names the same models; take them from the first one
+    tool = next(iter(tools.values()))
+    if provider == "openai":
+        caller = openai_caller(tool.OPENAI_MODEL, args.max_tokens)
+    else:
+        caller = anthropic_caller(tool.CLAUDE_MODEL, args.max_tokens)
+    limits = DEFAULT_LIMITS[provider]
+    limiter = ProviderLimiter(args.rpm or limits["rpm"], args.tpm or limits["tpm"])
+
+    start = time.perf_counter()
+    with open(args.checkpoint, "a", encoding="utf-8") as checkpoint:
+        engine = BatchEngine(
+            {provider: caller},
+            {provider: limiter},
+            {transform: tool.messages_for for transform, tool in tools.items()},
+            checkpoint,
+            workers=args.workers,
+            max_tokens=args.max_tokens,
+            max_attempts=args.max_attempts,
+            max_source_tokens=args.max_source_tokens,
+            overwrite=args.overwrite
+        )
+        stats = engine.run(pending, provider, print_progress)
+    print(f"Done in {time.perf_counter() - start:.0f} seconds: {stats}, "
+          f"{limiter.waited:.0f} worker-seconds spent waiting on rate limits", file=sys.stderr)
+    sys.exit(1 if stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+
+LLM_METRICS_LOG = os.getenv("LLM_METRICS_LOG", "llm_metrics.jsonl")
+CHARS_PER_TOKEN = 4
+
+_log_lock = threading.Lock()
+
+
+class StreamMetrics:
+    """Timing and token usage of one streamed completion, written as a JSON line when it ends.
+
+    connect_seconds is how long the request took to be accepted and time_to_first_token how long
+    until the first text arrived, so a slow provider and a slow network show up separately.
+    ui_seconds is the time the consumer spent on each yielded update before asking for the next
+    fragment, i.e. what the UI itself adds.
+    """
+
+    def __init__(self, tool, provider, model, log_path=LLM_METRICS_LOG):
+        self.tool = tool
+        self.provider = provider
+        self.model = model
+        self.log_path = log_path
+        self.started = time.perf_counter()
+        self.connected_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.chunks = 0
+        self.chars = 0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.ui_seconds = 0.0
+        self.ui_yields = 0
+        self.status = None
+
+    def connected(self):
+        if self.connected_at is None:
+            self.connected_at = time.perf_counter()
+
+    def fragment(self, text):
+        if not text:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chunks += 1
+        self.chars += len(text)
+
+    def usage(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    def openai(self, request):
+        """Text fragments of the OpenAI chat stream that request() creates.
+
+        Pass stream_options={"include_usage": True} to the create call to get token counts.
+        """
+        stream = request()
+        self.connected()
+        for chunk in stream:
+            # The usage arrives in a last chunk that has no choices
+            if getattr(chunk, "usage", None):
+                self.usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content or ""
+            self.fragment(text)
+            if text:
+                yield text
+
+    def anthropic(self, request):
+        """Text fragments of the Anthropic messages.stream(...) manager that request() returns"""
+        with request() as stream:
+            self.connected()
+            for text in stream.text_stream:
+                self.fragment(text)
+                yield text
+            usage = stream.get_final_message().usage
+            self.usage(usage.input_tokens, usage.output_tokens)
+
+    def ui(self):
+        return _UiTimer(self)
+
+    def _seconds(self, at):
+        return None if at is None else at - self.started
+
+    def tokens(self):
+        """Completion tokens as reported by the provider, estimated from the text until then"""
+        if self.completion_tokens is not None:
+            return self.completion_tokens
+        return (self.chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+    def tokens_per_second(self):
+        if self.first_token_at is None:
+            return None
+        end = self.finished_at or time.perf_counter()
+        generating = end - self.first_token_at
+        return self.tokens() / generating if generating > 0 else None
+
+    def record(self):
+        end = self.finished_at or time.perf_counter()
+        return {
+            "timestamp": time.time(),
+            "tool": self.tool,
+            "provider": self.provider,
+            "model": self.model,
+            "status": self.status or "streaming",
+            "connect_seconds": self._seconds(self.connected_at),
+            "time_to_first_token": self._seconds(self.first_token_at),
+            "total_seconds": end - self.started,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "estimated_tokens": self.completion_tokens is None,
+            "tokens_per_second": self.tokens_per_second(),
+            "chunks": self.chunks,
+            "ui_seconds": self.ui_seconds,
+            "ui_yields": self.ui_yields
+        }
+
+    def finish(self, status="ok"):
+        """Stop the clock and append the record to the log; later calls do nothing"""
+        if self.finished_at is not None:
+            return self.record()
+        self.finished_at = time.perf_counter()
+        self.status = status
+        record = self.record()
+        if self.log_path:
+            with _log_lock, open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        return record
+
+    def summary(self):
+        """Markdown for a live latency panel"""
+        record = self.record()
+
+        def seconds(value):
+            return "–" if value is None else f"{value:.2f}s"
+
+        rate = record["tokens_per_second"]
+        tokens = self.tokens() if self.first_token_at is not None else 0
+        prompt = "–" if self.prompt_tokens is None else self.prompt_tokens
+        estimated = " (estimated)" if record["estimated_tokens"] else ""
+        return (
+            f"**{self.provider} {self.model}** · {record['status']}\n\n"
+            f"| Connect | First token | Total | Tokens/s | Prompt tokens | Completion tokens | UI time |\n"
+            f"|---|---|---|---|---|---|---|\n"
+            f"| {seconds(record['connect_seconds'])} | {seconds(record['time_to_first_token'])} "
+            f"| {seconds(record['total_seconds'])} | {'–' if rate is None else f'{rate:.1f}'} "
+            f"| {prompt} | {tokens}{estimated} | {seconds(self.ui_seconds)} over {self.ui_yields} updates |"
+        )
+
+
+class _UiTimer:
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.ui_seconds += time.perf_counter() - self.start
+        self.metrics.ui_yields += 1
+        return False
+
+
+def instrumented(fragments, metrics, render):
+    """Accumulate fragments and yield (render(reply so far), latency panel) after each one.
+
+    The time spent away from this generator at each yield is the UI's share. The metrics are
+    logged when the stream ends, fails, or the consumer stops early.
+    """
+    reply = ""
+    status = "ok"
+    try:
+        for fragment in fragments:
+            reply += fragment
+            with metrics.ui():
+                yield render(reply), metrics.summary()
+    except GeneratorExit:
+        status = "cancelled"
+        raise
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        metrics.finish(status)
+    yield render(reply), metrics.summary()
@@ -0,0 +1,13 @@
+import os
+import shlex
+import subprocess
+
+CXX = os.getenv("CXX", "clang++")
+# Tuned for the M1 Mac the prompt targets; set CXXFLAGS to build on other machines
+CXXFLAGS = shlex.split(os.getenv("CXXFLAGS", "-Ofast -std=c++17 -march=armv8.5-a -mtune=apple-m1 -mcpu=apple-m1"))
+
+
+def compile_cpp(source, output, extra_flags=()):
+    """Compile the C++ file at source into output; raises CalledProcessError carrying the compiler's stderr"""
+    compile_cmd = [CXX, *CXXFLAGS, *extra_flags, "-o", output, source]
+    return subprocess.run(compile_cmd, check=True, text=True, capture_output=True)
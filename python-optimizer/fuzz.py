@@ -0,0 +1,454 @@
+import argparse
+import ast
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from compiler import compile_cpp
+
+# Lines that legitimately differ between the two runs
+DEFAULT_IGNORE = r"(?i)execution time"
+# Values that tend to expose int overflows and sign bugs in a translation
+INT_PROBES = (0, 1, -1, 2**31 - 1, -2**31, 2**31, 2**32 - 1, 2**32, 2**63 - 1, -2**63)
+FLOAT_PROBES = (0.0, -0.0, 1e-300, 1e300, 0.1)
+# Ints defaulting to at least this are assumed to be sizes (loop counts, lengths): kept small and
+# at least 1 so a quadratic program still runs in well under the timeout, and empty inputs (which
+# programs rarely define the same way in both languages) aren't reported as divergences
+SIZE_THRESHOLD = 1000
+
+CPP_LITERAL = r"[-+]?\s*(?:\d[\d']*\.?\d*|\.\d+)(?:[eE][-+]?\d+)?[uUlLfF]*"
+
+CPP_HELPERS = """#include <cstdlib>
+static long long fuzz_param_int(const char* name, long long fallback) {
+    const char* value = std::getenv(name);
+    return value ? std::strtoll(value, nullptr, 10) : fallback;
+}
+static double fuzz_param_float(const char* name, double fallback) {
+    const char* value = std::getenv(name);
+    return value ? std::strtod(value, nullptr) : fallback;
+}
+"""
+
+
+class Parameter:
+    """A module-level numeric constant of the Python program, and the range to draw it from"""
+
+    def __init__(self, name, default, low=None, high=None, max_size=200):
+        self.name = name
+        self.default = default
+        self.kind = "float" if isinstance(default, float) else "int"
+        self.is_size = self.kind == "int" and default >= SIZE_THRESHOLD
+        # A range given by the user is a hard bound; the default one still lets overflow probes through
+        self.bounded = low is not None and high is not None
+        if not self.bounded:
+            if self.is_size:
+                low, high = 1, max_size
+            else:
+                spread = max(4 * abs(default), 16)
+                low, high = -spread, spread
+        self.low = low
+        self.high = high
+
+    def clamp(self, value):
+        return min(max(value, self.low), self.high)
+
+    def allows(self, value):
+        return (not self.bounded or self.low <= value <= self.high) and (not self.is_size or value >= 1)
+
+    def sample(self, rng):
+        probes = [probe for probe in (FLOAT_PROBES if self.kind == "float" else INT_PROBES) if self.allows(probe)]
+        if probes and not self.is_size and rng.random() < 0.2:
+            return rng.choice(probes)
+        if self.kind == "float":
+            return rng.uniform(self.low, self.high)
+        return rng.randint(self.low, self.high)
+
+    def simplest(self):
+        """Zero, or the allowed value nearest to it"""
+        zero = 0.0 if self.kind == "float" else 0
+        return self.clamp(zero) if self.bounded or self.is_size else zero
+
+    def between(self, passing, failing, count):
+        """Up to count values strictly between passing and failing, nearest passing first"""
+        gap = failing - passing
+        if self.kind == "float":
+            if abs(gap) <= 1e-9 * max(1.0, abs(failing)):
+                return []
+            return [passing + gap * i / (count + 1) for i in range(1, count + 1)]
+        points = []
+        for i in range(1, min(count, abs(gap) - 1) + 1):
+            point = passing + gap * i // (count + 1) if gap > 0 else passing - (-gap) * i // (count + 1)
+            if point not in points and point not in (passing, failing):
+                points.append(point)
+        return points
+
+    def __repr__(self):
+        return f"{self.name}={self.default!r} ({self.kind}, {self.low}..{self.high})"
+
+
+def _numeric_constant(node):
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _numeric_constant(node.operand)
+        return None if value is None else (-value if isinstance(node.op, ast.USub) else value)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    return None
+
+
+def find_parameters(python, ranges=None, max_size=200):
+    """Module-level `name = <number>` assignments, which is where these programs keep their inputs"""
+    ranges = ranges or {}
+    parameters = []
+    for node in ast.parse(python).body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            value = _numeric_constant(node.value)
+            name = node.targets[0].id
+            if value is not None and all(p.name != name for p in parameters):
+                low, high = ranges.get(name, (None, None))
+                parameters.append(Parameter(name, value, low, high, max_size))
+    return parameters
+
+
+def python_with(python, values):
+    """The Python program with each parameter's first assignment replaced by the given value"""
+    tree = ast.parse(python)
+    pending = dict(values)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            if name in pending:
+                node.value = ast.parse(repr(pending.pop(name)), mode="eval").body
+    return ast.unparse(ast.fix_missing_locations(tree))
+
+
+def parameterize_cpp(cpp, parameters):
+    """Make the C++ read each parameter from the environment, falling back to its literal.
+
+    The first `name = <literal>` (or `name{<literal>}`) in the source is taken to be the
+    declaration. Returns the new source and the parameters that could not be found, which
+    then stay at their defaults on both sides.
+    """
+    missing = []
+    for parameter in parameters:
+        pattern = re.compile(
+            rf"(?<![\w.>])({re.escape(parameter.name)}\s*(?:=\s*|\{{\s*))({CPP_LITERAL})(?=\s*[;,}})])"
+        )
+        match = pattern.search(cpp)
+        if not match:
+            missing.append(parameter)
+            continue
+        helper = "fuzz_param_float" if parameter.kind == "float" else "fuzz_param_int"
+        replacement = f'{match.group(1)}{helper}("{env_name(parameter.name)}", {match.group(2)})'
+        # A constexpr can't be initialized from getenv
+        statement_start = max(cpp.rfind(";", 0, match.start()), cpp.rfind("{", 0, match.start()), cpp.rfind("}", 0, match.start())) + 1
+        prefix = cpp[statement_start:match.start()].replace("constexpr", "const")
+        cpp = cpp[:statement_start] + prefix + replacement + cpp[match.end():]
+    return CPP_HELPERS + cpp, missing
+
+
+def env_name(name):
+    return f"FUZZ_{name}"
+
+
+def _number(token):
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def normalize_output(text, ignore=DEFAULT_IGNORE):
+    pattern = re.compile(ignore) if ignore else None
+    return [line.rstrip() for line in text.strip().splitlines() if not (pattern and pattern.search(line))]
+
+
+def _token_kind(a, b):
+    x, y = _number(a), _number(b)
+    if x is None or y is None:
+        return "text"
+    return "number" if math.isfinite(x) and math.isfinite(y) else "non-finite"
+
+
+def mismatch_kind(expected, actual, tolerance=1e-9):
+    """Where and how two normalized outputs differ: (line index, token kind), or None if they match.
+
+    Used to tell divergences apart, so an overflow isn't confused with e.g. an empty-input edge case.
+    """
+    if len(expected) != len(actual):
+        return ("line count", len(expected), len(actual))
+    for index, (expected_line, actual_line) in enumerate(zip(expected, actual)):
+        if outputs_match([expected_line], [actual_line], tolerance):
+            continue
+        expected_tokens, actual_tokens = expected_line.split(), actual_line.split()
+        if len(expected_tokens) != len(actual_tokens):
+            return (index, "token count")
+        for a, b in zip(expected_tokens, actual_tokens):
+            if not outputs_match([a], [b], tolerance):
+                return (index, _token_kind(a, b))
+    return None
+
+
+def outputs_match(expected, actual, tolerance=1e-9):
+    """Compare line by line; numbers match within tolerance so 1e+06 and 1000000.0 are equal"""
+    if len(expected) != len(actual):
+        return False
+    for expected_line, actual_line in zip(expected, actual):
+        expected_tokens, actual_tokens = expected_line.split(), actual_line.split()
+        if len(expected_tokens) != len(actual_tokens):
+            return False
+        for a, b in zip(expected_tokens, actual_tokens):
+            if a == b:
+                continue
+            x, y = _number(a), _number(b)
+            if x is None or y is None:
+                return False
+            if not (x == y or math.isclose(x, y, rel_tol=tolerance, abs_tol=tolerance)):
+                return False
+    return True
+
+
+class DifferentialFuzzer:
+    """Runs the Python program and its C++ translation on the same generated inputs.
+
+    The C++ is compiled once with its parameters read from FUZZ_<name> environment variables;
+    the Python is rewritten per input. Both run as subprocesses, several inputs at a time, so
+    the work spreads across cores. An input is skipped when the Python raises or times out: the
+    reference has no answer for it. Shrinking only keeps inputs that diverge the same way as the
+    one found, e.g. the same C++ crash or the same output line differing in the same kind of value.
+    """
+
+    def __init__(self, python, cpp, ranges=None, assume=None, timeout=10, workers=None,
+                 tolerance=1e-9, ignore=DEFAULT_IGNORE, max_size=200, seed=0):
+        self.python = python
+        self.parameters = find_parameters(python, ranges, max_size)
+        if not self.parameters:
+            raise ValueError("No module-level numeric parameters found in the Python code")
+        self.cpp, missing = parameterize_cpp(cpp, self.parameters)
+        self.fixed = [p.name for p in missing]
+        self.parameters = [p for p in self.parameters if p not in missing]
+        if not self.parameters:
+            raise ValueError(f"None of the parameters ({', '.join(self.fixed)}) were found in the C++ code")
+        self.assume = assume
+        self.timeout = timeout
+        self.workers = workers or os.cpu_count() or 1
+        self.tolerance = tolerance
+        self.ignore = ignore
+        self.rng = random.Random(seed)
+        self.binary = None
+        self.checked = 0
+        self.skipped = 0
+
+    def build(self, build_dir):
+        source = os.path.join(build_dir, "fuzzed.cpp")
+        with open(source, "w") as f:
+            f.write(self.cpp)
+        binary = os.path.join(build_dir, "fuzzed")
+        compile_cpp(source, binary)
+        self.binary = binary
+
+    def _run(self, cmd, env=None):
+        try:
+            result = subprocess.run(cmd, text=True, capture_output=True, timeout=self.timeout, env=env)
+        except subprocess.TimeoutExpired:
+            return "timeout", ""
+        if result.returncode != 0:
+            return f"exit code {result.returncode}", result.stderr.strip()[-500:]
+        return "ok", result.stdout
+
+    def run_python(self, values):
+        return self._run([sys.executable, "-c", python_with(self.python, values)])
+
+    def run_cpp(self, values):
+        env = dict(os.environ)
+        env.update({env_name(name): repr(value) if isinstance(value, float) else str(value) for name, value in values.items()})
+        return self._run([self.binary], env=env)
+
+    def check(self, values):
+        """Returns (verdict, python output, C++ output, kind); verdict is match, diverge or skip,
+        and kind describes a divergence (see mismatch_kind)"""
+        python_status, python_output = self.run_python(values)
+        if python_status != "ok":
+            return "skip", python_output, "", None
+        cpp_status, cpp_output = self.run_cpp(values)
+        if cpp_status != "ok":
+            return "diverge", python_output, f"[{cpp_status}] {cpp_output}", ("C++ " + cpp_status,)
+        expected = normalize_output(python_output, self.ignore)
+        actual = normalize_output(cpp_output, self.ignore)
+        kind = mismatch_kind(expected, actual, self.tolerance)
+        return ("match" if kind is None else "diverge"), python_output, cpp_output, kind
+
+    def allowed(self, values):
+        return self.assume is None or bool(eval(self.assume, {"__builtins__": {}}, dict(values)))
+
+    def generate(self):
+        for _ in range(1000):
+            values = {p.name: p.sample(self.rng) for p in self.parameters}
+            if self.allowed(values):
+                return values
+        raise ValueError(f"Could not generate inputs satisfying: {self.assume}")
+
+    def _check_all(self, pool, inputs):
+        results = list(pool.map(self.check, inputs))
+        for verdict, _, _, _ in results:
+            self.checked += 1
+            self.skipped += verdict == "skip"
+        return results
+
+    def _diverging(self, pool, values, name, points, kind):
+        """Index of the first point (given to parameter name) that still diverges as kind, or None"""
+        trials = [{**values, name: point} for point in points]
+        allowed = [trial for trial in trials if self.allowed(trial)]
+        kinds = dict(zip(map(id, allowed), (result[3] for result in self._check_all(pool, allowed))))
+        return next((i for i, trial in enumerate(trials) if kinds.get(id(trial)) == kind), None)
+
+    def _shrink_parameter(self, values, parameter, pool, kind, max_rounds=64):
+        failing = values[parameter.name]
+        passing = parameter.simplest()
+        if passing == failing:
+            return failing
+        if self._diverging(pool, values, parameter.name, [passing], kind) == 0:
+            return passing
+        # Search the interval between a passing and a failing value, workers points at a time,
+        # for the failing value nearest the simple end
+        for _ in range(max_rounds):
+            points = parameter.between(passing, failing, self.workers)
+            if not points:
+                break
+            index = self._diverging(pool, values, parameter.name, points, kind)
+            if index is None:
+                passing = points[-1]
+            else:
+                failing = points[index]
+                if index > 0:
+                    passing = points[index - 1]
+        return failing
+
+    def shrink(self, values, pool, kind):
+        """Move one parameter at a time towards zero while the outputs still diverge the same way"""
+        steps = 0
+        changed = True
+        while changed:
+            changed = False
+            for parameter in self.parameters:
+                shrunk = self._shrink_parameter(values, parameter, pool, kind)
+                if shrunk != values[parameter.name]:
+                    values = {**values, parameter.name: shrunk}
+                    steps += 1
+                    changed = True
+        return values, steps
+
+    def fuzz(self, count=200):
+        """Check up to count inputs; returns a report of the first divergence and its shrunk form"""
+        start = time.perf_counter()
+        report = {"parameters": [repr(p) for p in self.parameters], "fixed": self.fixed, "divergence": None}
+        with tempfile.TemporaryDirectory(prefix="fuzz-") as build_dir, ThreadPoolExecutor(max_workers=self.workers) as pool:
+            self.build(build_dir)
+            # The default inputs first (sizes capped): the sample run the user already looked at
+            defaults = {p.name: p.clamp(p.default) for p in self.parameters}
+            batch_size = self.workers * 2
+            pending = [defaults] + [self.generate() for _ in range(count - 1)]
+            for offset in range(0, len(pending), batch_size):
+                batch = pending[offset:offset + batch_size]
+                results = self._check_all(pool, batch)
+                # Results come back in input order, so this is the first divergence of the run
+                found = next(((values, result) for values, result in zip(batch, results) if result[0] == "diverge"), None)
+                if found is not None:
+                    values, (_, _, _, kind) = found
+                    shrunk, steps = self.shrink(values, pool, kind)
+                    _, python_output, cpp_output, _ = self.check(shrunk)
+                    report["divergence"] = {
+                        "input": values,
+                        "shrunk": shrunk,
+                        "shrink_steps": steps,
+                        "kind": kind,
+                        "python_output": python_output,
+                        "cpp_output": cpp_output
+                    }
+                    break
+        report["checked"] = self.checked
+        report["skipped"] = self.skipped
+        report["seconds"] = time.perf_counter() - start
+        return report
+
+
+def describe_kind(kind):
+    if len(kind) == 1:
+        return kind[0]
+    if kind[0] == "line count":
+        return f"Python printed {kind[1]} lines, C++ {kind[2]}"
+    return f"line {kind[0] + 1} differs: {kind[1]}"
+
+
+def format_report(report):
+    lines = [f"Parameters: {', '.join(report['parameters'])}"]
+    if report["fixed"]:
+        lines.append(f"Not found in the C++, left at their defaults: {', '.join(report['fixed'])}")
+    lines.append(f"Checked {report['checked']} inputs ({report['skipped']} skipped: the Python failed or timed out) "
+                 f"in {report['seconds']:.1f} seconds")
+    divergence = report["divergence"]
+    if divergence is None:
+        lines.append("No divergence found")
+        return "\n".join(lines)
+    lines.append(f"First diverging input: {divergence['input']} ({describe_kind(divergence['kind'])})")
+    lines.append(f"Shrunk to ({divergence['shrink_steps']} steps): {divergence['shrunk']}")
+    lines.append("Python output:")
+    lines.append(divergence["python_output"].rstrip())
+    lines.append("C++ output:")
+    lines.append(divergence["cpp_output"].rstrip())
+    return "\n".join(lines)
+
+
+def parse_range(text):
+    name, _, bounds = text.partition("=")
+    low, _, high = bounds.partition(":")
+    number = float if "." in bounds or "e" in bounds.lower() else int
+    return name, (number(low), number(high))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differentially fuzz a Python program against its C++ translation")
+    parser.add_argument("python", help="Python source file")
+    parser.add_argument("cpp", help="C++ source file")
+    parser.add_argument("--inputs", type=int, default=200, help="number of inputs to check")
+    parser.add_argument("--range", action="append", default=[], type=parse_range, metavar="NAME=LOW:HIGH",
+                        help="range to draw a parameter from (repeatable)")
+    parser.add_argument("--assume", help='Python expression inputs must satisfy, e.g. "min_val <= max_val"')
+    parser.add_argument("--max-size", type=int, default=200, help="upper bound for size-like parameters")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds per run")
+    parser.add_argument("--workers", type=int, help="parallel inputs (default: CPU count)")
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="relative tolerance for numbers in the output")
+    parser.add_argument("--ignore", default=DEFAULT_IGNORE, help="regex of output lines to ignore")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.python) as f:
+        python = f.read()
+    with open(args.cpp) as f:
+        cpp = f.read()
+    fuzzer = DifferentialFuzzer(
+        python, cpp,
+        ranges=dict(args.range),
+        assume=args.assume,
+        timeout=args.timeout,
+        workers=args.workers,
+        tolerance=args.tolerance,
+        ignore=args.ignore,
+        max_size=args.max_size,
+        seed=args.seed
+    )
+    try:
+        report = fuzzer.fuzz(args.inputs)
+    except subprocess.CalledProcessError as e:
+        print(f"The C++ did not compile:\n{e.stderr}", file=sys.stderr)
+        sys.exit(2)
+    print(format_report(report))
+    sys.exit(1 if report["divergence"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+import argparse
+import ast
+import contextlib
+import cProfile
+import ctypes
+import functools
+import inspect
+import io
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import time
+from compiler import compile_cpp
+from fuzz import normalize_output, outputs_match
+from refine import extract_cpp
+
+PROGRAM_FILENAME = "<program>"
+# Python type of an argument or result -> (C++ type in the signature, ctypes type)
+NATIVE_TYPES = {
+    "int": ("int64_t", ctypes.c_int64),
+    "float": ("double", ctypes.c_double),
+    "bool": ("bool", ctypes.c_bool),
+}
+INT64_MIN, INT64_MAX = -2**63, 2**63 - 1
+
+system_message = "You are an assistant that reimplements hot Python functions in high performance C++ "
+system_message += "for a shared library loaded from Python with ctypes. "
+system_message += "Respond only with C++ code; use comments sparingly and do not provide any explanation other than occasional comments. "
+system_message += "Each function must return exactly what the Python function returns, in the fastest possible time."
+
+
+def _type_name(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int" if INT64_MIN <= value <= INT64_MAX else "bigint"
+    return type(value).__name__
+
+
+class TypeRecorder:
+    """Wraps functions to note the types of their arguments and results on every call"""
+
+    def __init__(self):
+        self.observed = {}  # name -> {"args": [set of type names per parameter], "return": set}
+
+    def wrap(self, name, function):
+        observed = self.observed.setdefault(name, {"args": None, "return": set()})
+
+        @functools.wraps(function)
+        def recorder(*args):
+            if observed["args"] is None:
+                observed["args"] = [set() for _ in args]
+            for seen, arg in zip(observed["args"], args):
+                seen.add(_type_name(arg))
+            result = function(*args)
+            observed["return"].add(_type_name(result))
+            return result
+        return recorder
+
+
+class Hotspot:
+    def __init__(self, name, params, calls, self_seconds, cumulative_seconds, observed):
+        self.name = name
+        self.params = params
+        self.calls = calls
+        self.self_seconds = self_seconds
+        self.cumulative_seconds = cumulative_seconds
+        self.arg_types = None
+        self.return_type = None
+        self.reason = self._infer_types(observed)
+
+    def _infer_types(self, observed):
+        """Fills in the native types; returns why the function can't be offloaded, or None"""
+        if observed is None or observed["args"] is None:
+            return "never called"
+        slots = observed["args"] + [observed["return"]]
+        if len(observed["args"]) != len(self.params):
+            return "called with a different number of arguments than it declares"
+        for seen in slots:
+            if len(seen) != 1 or next(iter(seen)) not in NATIVE_TYPES:
+                return f"argument or result types {sorted(seen)} have no fixed native type"
+        self.arg_types = [next(iter(seen)) for seen in observed["args"]]
+        self.return_type = next(iter(observed["return"]))
+        return None
+
+    @property
+    def offloadable(self):
+        return self.reason is None
+
+    def signature(self):
+        params = ", ".join(f"{NATIVE_TYPES[t][0]} {name}" for t, name in zip(self.arg_types, self.params))
+        return f'extern "C" {NATIVE_TYPES[self.return_type][0]} {self.name}({params})'
+
+
+def program_functions(python):
+    """Module-level functions that could become a native call: plain positional parameters and no yield"""
+    functions = {}
+    for node in ast.parse(python).body:
+        if not isinstance(node, ast.FunctionDef):
+            continue
+        args = node.args
+        if args.vararg or args.kwarg or args.kwonlyargs or args.posonlyargs:
+            continue
+        if any(isinstance(child, (ast.Yield, ast.YieldFrom)) for child in ast.walk(node)):
+            continue
+        functions[node.name] = [arg.arg for arg in args.args]
+    return functions
+
+
+def rebind_after_definitions(python, names, statement):
+    """Insert statement, formatted with the function's name, right after each named function's def"""
+    tree = ast.parse(python)
+    body = []
+    for node in tree.body:
+        body.append(node)
+        if isinstance(node, ast.FunctionDef) and node.name in names:
+            body.extend(ast.parse(statement.format(name=node.name)).body)
+    tree.body = body
+    return ast.unparse(ast.fix_missing_locations(tree))
+
+
+def run_program(code, extra_globals=None, profiler=None):
+    """exec the program as __main__; returns (printed output, wall seconds)"""
+    namespace = {"__name__": "__main__", **(extra_globals or {})}
+    compiled = compile(code, PROGRAM_FILENAME, "exec")
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        if profiler is not None:
+            profiler.enable()
+        try:
+            exec(compiled, namespace)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+    return output.getvalue(), time.perf_counter() - start
+
+
+def profile(python):
+    """Run the program under cProfile; returns its output and the program's functions, hottest first.
+
+    Functions are ranked by their own time, excluding the functions they call, so the one doing
+    the actual looping comes first rather than the top-level driver.
+    """
+    functions = program_functions(python)
+    recorder = TypeRecorder()
+    # The recording wrapper is a separate function to cProfile, so its time isn't billed to the
+    # function it wraps and the self times stay accurate
+    code = rebind_after_definitions(python, functions, "{name} = __record__('{name}', {name})")
+    profiler = cProfile.Profile()
+    output, seconds = run_program(code, {"__record__": recorder.wrap}, profiler)
+
+    stats = pstats.Stats(profiler).stats
+    hotspots = []
+    for (filename, _, name), (_, calls, self_seconds, cumulative_seconds, _) in stats.items():
+        if filename == PROGRAM_FILENAME and name in functions:
+            hotspots.append(Hotspot(name, functions[name], calls, self_seconds, cumulative_seconds,
+                                    recorder.observed.get(name)))
+    hotspots.sort(key=lambda hotspot: hotspot.self_seconds, reverse=True)
+    return output, seconds, hotspots
+
+
+def user_prompt_for(python, hotspots):
+    user_prompt = "This Python program spends most of its time in the functions listed below. "
+    user_prompt += "Rewrite only those functions in C++ with the fastest possible implementation, as a shared library with no main. "
+    user_prompt += "Export each one with exactly this signature:\n"
+    user_prompt += "\n".join(hotspot.signature() for hotspot in hotspots)
+    user_prompt += "\nAny Python helpers they call, such as generators, become static C++ functions. "
+    user_prompt += "Pay attention to number types to ensure no int overflows; results must be identical to the Python. "
+    user_prompt += "Remember to #include all necessary C++ packages such as cstdint.\n\n"
+    user_prompt += python
+    return user_prompt
+
+
+def messages_for(python, hotspots):
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_prompt_for(python, hotspots)}
+    ]
+
+
+def bind_native(library, hotspot, function):
+    """A Python callable with the original function's signature that calls into the library"""
+    native = getattr(library, hotspot.name)
+    native.argtypes = [NATIVE_TYPES[t][1] for t in hotspot.arg_types]
+    native.restype = NATIVE_TYPES[hotspot.return_type][1]
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def call(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return native(*bound.args)
+    return call
+
+
+def original_functions(python, names):
+    namespace = {}
+    # Definitions only, so the program itself doesn't run again
+    tree = ast.parse(python)
+    tree.body = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef))]
+    exec(compile(tree, PROGRAM_FILENAME, "exec"), namespace)
+    return {name: namespace[name] for name in names}
+
+
+def offload(python, complete, top=1, max_attempts=3):
+    """Profile the program, have the model write its hottest functions in C++, and run it with those.
+
+    Returns a report with the profile, the C++ and the end-to-end times; `complete` takes a
+    message list and returns (reply text, tokens used). Compiler errors and wrong output go back
+    to the model for up to max_attempts tries.
+    """
+    python_output, python_seconds = run_program(python)
+    _, profiled_seconds, hotspots = profile(python)
+    report = {
+        "python_seconds": python_seconds,
+        "profiled_seconds": profiled_seconds,
+        "hotspots": hotspots,
+        "offloaded": [],
+        "attempts": [],
+        "tokens": 0,
+        "cpp": None,
+        "native_seconds": None,
+        "speedup": None
+    }
+    chosen = [hotspot for hotspot in hotspots if hotspot.offloadable][:top]
+    if not chosen:
+        raise ValueError("No hot function takes and returns only ints, floats or bools")
+    report["offloaded"] = [hotspot.name for hotspot in chosen]
+    originals = original_functions(python, report["offloaded"])
+    code = rebind_after_definitions(python, report["offloaded"], "{name} = __native__['{name}']")
+
+    messages = messages_for(python, chosen)
+    with tempfile.TemporaryDirectory(prefix="hotspots-") as build_dir:
+        for attempt in range(1, max_attempts + 1):
+            reply, tokens = complete(messages)
+            report["tokens"] += tokens
+            cpp = extract_cpp(reply)
+            source = os.path.join(build_dir, f"hotspots{attempt}.cpp")
+            # A new file per attempt: dlopen returns the already loaded library for a path it has seen
+            library_path = os.path.join(build_dir, f"hotspots{attempt}.so")
+            with open(source, "w") as f:
+                f.write(cpp)
+
+            try:
+                compile_cpp(source, library_path, extra_flags=("-shared", "-fPIC"))
+                library = ctypes.CDLL(library_path)
+                natives = {hotspot.name: bind_native(library, hotspot, originals[hotspot.name]) for hotspot in chosen}
+                output, native_seconds = run_program(code, {"__native__": natives})
+            except subprocess.CalledProcessError as e:
+                feedback = f"The C++ failed to compile:\n{e.stderr[-4000:]}\nFix the errors and respond with the complete library."
+                report["attempts"].append("compile error")
+            except Exception as e:
+                feedback = f"Calling the library failed: {e!r}\nRespond with the complete fixed library."
+                report["attempts"].append(f"call error: {e!r}")
+            else:
+                if outputs_match(normalize_output(python_output), normalize_output(output)):
+                    report["attempts"].append("ok")
+                    report["cpp"] = cpp
+                    report["native_seconds"] = native_seconds
+                    report["speedup"] = python_seconds / native_seconds if native_seconds else float("inf")
+                    return report
+                feedback = (f"With the C++ functions the program printed:\n{output[-4000:]}\n"
+                            f"but the Python alone printed:\n{python_output[-4000:]}\n"
+                            "Check number types for overflow and respond with the complete fixed library.")
+                report["attempts"].append("mismatch")
+            report["cpp"] = cpp
+            messages = messages_for(python, chosen) + [
+                {"role": "assistant", "content": reply},
+                {"role": "user", "content": feedback}
+            ]
+    return report
+
+
+def format_report(report):
+    lines = [f"Python: {report['python_seconds']:.3f}s ({report['profiled_seconds']:.3f}s under the profiler)",
+             "Hotspots by own time:"]
+    for hotspot in report["hotspots"]:
+        share = hotspot.self_seconds / report["profiled_seconds"] * 100 if report["profiled_seconds"] else 0
+        detail = hotspot.signature() if hotspot.offloadable else f"not offloadable: {hotspot.reason}"
+        lines.append(f"  {hotspot.name}: {hotspot.calls} calls, {hotspot.self_seconds:.3f}s own "
+                     f"({share:.0f}%), {hotspot.cumulative_seconds:.3f}s total; {detail}")
+    lines.append(f"Offloaded: {', '.join(report['offloaded'])}")
+    lines.append(f"Attempts: {', '.join(report['attempts'])} ({report['tokens']} tokens)")
+    if report["speedup"] is None:
+        lines.append("No attempt produced matching output")
+    else:
+        lines.append(f"Python with native hotspots: {report['native_seconds']:.3f}s, "
+                     f"{report['speedup']:.1f}x faster end to end")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move a Python program's hottest functions into a C++ shared library")
+    parser.add_argument("python", help="Python source file")
+    parser.add_argument("--model", choices=["GPT", "Claude"], default="GPT")
+    parser.add_argument("--top", type=int, default=1, help="number of hotspot functions to offload")
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--output", default="hotspots.cpp", help="where to write the C++ library source")
+    args = parser.parse_args()
+
+    # Imported here so the module can be used without the UI's dependencies
+    from python_optimizer import complete_claude, complete_gpt
+
+    with open(args.python) as f:
+        python = f.read()
+    report = offload(python, complete_gpt if args.model == "GPT" else complete_claude, args.top, args.attempts)
+    print(format_report(report))
+    if report["cpp"] is not None:
+        with open(args.output, "w") as f:
+            f.write(report["cpp"])
+    sys.exit(0 if report["speedup"] is not None else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,14 @@ import anthropic
 from IPython.display import Markdown, display, update_display
 import gradio as gr
 import subprocess
+from compiler import compile_cpp
+from fuzz import DifferentialFuzzer, format_report, parse_range
+from refine import Refiner, format_record
+import hotspots
+
+# Shared with the other LLM tools in this repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "llm-common"))
+from llm_metrics import StreamMetrics, instrumented
 
 # environment
 load_dotenv(override=True)
@@ -42,26 +50,41 @@ def write_output(cpp):
     with open("optimized.cpp", "w") as f:
         f.write(code)
 
-def stream_gpt(python):    
-    stream = openai.chat.completions.create(model=OPENAI_MODEL, messages=messages_for(python), stream=True)
-    reply = ""
-    for chunk in stream:
-        fragment = chunk.choices[0].delta.content or ""
-        reply += fragment
-        yield reply.replace('```cpp\n','').replace('```','')
+def clean_reply(reply):
+    return reply.replace('```cpp\n','').replace('```','')
+
+def stream_gpt(python):
+    metrics = StreamMetrics("python_optimizer", "openai", OPENAI_MODEL)
+    fragments = metrics.openai(lambda: openai.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages_for(python),
+        stream=True,
+        stream_options={"include_usage": True},
+    ))
+    yield from instrumented(fragments, metrics, clean_reply)
 
 def stream_claude(python):
-    result = claude.messages.stream(
+    metrics = StreamMetrics("python_optimizer", "anthropic", CLAUDE_MODEL)
+    fragments = metrics.anthropic(lambda: claude.messages.stream(
         model=CLAUDE_MODEL,
         max_tokens=2000,
         system=system_message,
         messages=[{"role": "user", "content": user_prompt_for(python)}],
+    ))
+    yield from instrumented(fragments, metrics, clean_reply)
+
+def complete_gpt(messages):
+    response = openai.chat.completions.create(model=OPENAI_MODEL, messages=messages)
+    return response.choices[0].message.content, response.usage.total_tokens
+
+def complete_claude(messages):
+    response = claude.messages.create(
+        model=CLAUDE_MODEL,
+        max_tokens=2000,
+        system=messages[0]["content"],
+        messages=messages[1:],
     )
-    reply = ""
-    with result as stream:
-        for text in stream.text_stream:
-            reply += text
-            yield reply.replace('```cpp\n','').replace('```','')
+    return response.content[0].text, response.usage.input_tokens + response.usage.output_tokens
 
 def optimize(python, model):
     if model=="GPT":
@@ -70,8 +93,8 @@ def optimize(python, model):
         result = stream_claude(python)
     else:
         raise ValueError("Unknown model")
-    for stream_so_far in result:
-        yield stream_so_far        
+    for stream_so_far, latency in result:
+        yield stream_so_far, latency
 
 python_hard = """
 def lcg(seed, a=1664525, c=1013904223, m=2**32):
@@ -130,14 +153,60 @@ def execute_python(code):
 def execute_cpp(code):
         write_output(code)
         try:
-            compile_cmd = ["clang++", "-Ofast", "-std=c++17", "-march=armv8.5-a", "-mtune=apple-m1", "-mcpu=apple-m1", "-o", "optimized", "optimized.cpp"]
-            compile_result = subprocess.run(compile_cmd, check=True, text=True, capture_output=True)
+            compile_cpp("optimized.cpp", "optimized")
             run_cmd = ["./optimized"]
             run_result = subprocess.run(run_cmd, check=True, text=True, capture_output=True)
             return run_result.stdout
         except subprocess.CalledProcessError as e:
             return f"An error occurred:\n{e.stderr}"
 
+def fuzz_cpp(python, cpp, ranges, assume):
+    try:
+        # Ranges are NAME=LOW:HIGH, separated by commas or spaces
+        ranges = dict(parse_range(text) for text in ranges.replace(",", " ").split())
+        fuzzer = DifferentialFuzzer(python, cpp.replace("```cpp","").replace("```",""), ranges=ranges, assume=assume.strip() or None)
+        return format_report(fuzzer.fuzz())
+    except subprocess.CalledProcessError as e:
+        return f"An error occurred:\n{e.stderr}"
+    except (ValueError, SyntaxError, NameError) as e:
+        return f"An error occurred: {e}"
+
+def refine_cpp(python, model, target_speedup):
+    if model=="GPT":
+        complete = complete_gpt
+    elif model=="Claude":
+        complete = complete_claude
+    else:
+        raise ValueError("Unknown model")
+    refiner = Refiner(python, complete, messages_for, target_speedup=target_speedup, model_name=model)
+    log = ""
+    try:
+        for record in refiner.run():
+            log += format_record(record) + "\n"
+            yield record["cpp"], log
+    except subprocess.CalledProcessError as e:
+        yield "", log + f"The Python failed:\n{e.stderr}"
+        return
+    except subprocess.TimeoutExpired:
+        yield "", log + f"The Python did not finish within {refiner.run_timeout} seconds, so there is no baseline to compare against"
+        return
+    if refiner.best is not None:
+        log += f"Best: iteration {refiner.best['iteration']}, {refiner.best['speedup']:.1f}x"
+        yield refiner.best["cpp"], log
+
+def offload_hotspots(python, model):
+    if model=="GPT":
+        complete = complete_gpt
+    elif model=="Claude":
+        complete = complete_claude
+    else:
+        raise ValueError("Unknown model")
+    try:
+        report = hotspots.offload(python, complete)
+    except ValueError as e:
+        return "", str(e)
+    return report["cpp"] or "", hotspots.format_report(report)
+
 css = """
 .python {background-color: #306998;}
 .cpp {background-color: #050;}
@@ -150,17 +219,34 @@ with gr.Blocks(css=css) as ui:
         cpp = gr.Textbox(label="C++ code:", lines=10)
     with gr.Row():
         model = gr.Dropdown(["GPT", "Claude"], label="Select model", value="GPT")
+        target_speedup = gr.Number(label="Target speedup:", value=10)
+    with gr.Row():
+        fuzz_ranges = gr.Textbox(label="Fuzz ranges (NAME=LOW:HIGH, ...):", placeholder="n=1:500, min_val=-100:0")
+        fuzz_assume = gr.Textbox(label="Fuzz inputs must satisfy (Python expression):", value="min_val <= max_val")
+    with gr.Row():
+        latency = gr.Markdown()
     with gr.Row():
         convert = gr.Button("Convert code")
+        refine = gr.Button("Convert and refine")
+        offload = gr.Button("Offload hotspots")
     with gr.Row():
         python_run = gr.Button("Run Python")
         cpp_run = gr.Button("Run C++")
+        cpp_fuzz = gr.Button("Fuzz C++")
     with gr.Row():
         python_out = gr.TextArea(label="Python result:", elem_classes=["python"])
         cpp_out = gr.TextArea(label="C++ result:", elem_classes=["cpp"])
+    with gr.Row():
+        fuzz_out = gr.TextArea(label="Fuzz result:")
+        refine_out = gr.TextArea(label="Refinement log:")
+        hotspots_out = gr.TextArea(label="Hotspot report:")
 
-    convert.click(optimize, inputs=[python, model], outputs=[cpp])
+    convert.click(optimize, inputs=[python, model], outputs=[cpp, latency])
+    refine.click(refine_cpp, inputs=[python, model, target_speedup], outputs=[cpp, refine_out])
+    offload.click(offload_hotspots, inputs=[python, model], outputs=[cpp, hotspots_out])
     python_run.click(execute_python, inputs=[python], outputs=[python_out])
     cpp_run.click(execute_cpp, inputs=[cpp], outputs=[cpp_out])
+    cpp_fuzz.click(fuzz_cpp, inputs=[python, cpp, fuzz_ranges, fuzz_assume], outputs=[fuzz_out])
 
-ui.launch(inbrowser=True)
+if __name__ == "__main__":
+    ui.launch(inbrowser=True)
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from compiler import compile_cpp
+from fuzz import DEFAULT_IGNORE, normalize_output, outputs_match
+
+REFINE_LOG = os.getenv("REFINE_LOG", "refine.jsonl")
+# Compiler errors and outputs are cut to this many characters before going back to the model
+FEEDBACK_CHARS = 4000
+FENCE_RE = re.compile(r"```(?:[\w+-]*)\n(.*?)```", re.DOTALL)
+
+
+def extract_cpp(reply):
+    """The code inside the first fenced block, or the whole reply when it isn't fenced"""
+    match = FENCE_RE.search(reply)
+    return (match.group(1) if match else reply.replace("```cpp", "").replace("```", "")).strip() + "\n"
+
+
+def _clip(text):
+    return text if len(text) <= FEEDBACK_CHARS else "...\n" + text[-FEEDBACK_CHARS:]
+
+
+def timed_run(cmd, timeout, repeats=1):
+    """Run cmd repeats times; returns (stdout of the last run, fastest wall time in seconds)"""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run(cmd, check=True, text=True, capture_output=True, timeout=timeout)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result.stdout, best
+
+
+class Refiner:
+    """Asks the model for C++, checks it, and sends what went wrong back until it is good enough.
+
+    Each attempt is compiled, run and compared with the Python output; a correct attempt must
+    also be target_speedup times faster than the Python. Compiler errors, mismatched output and
+    missed speedups become the next prompt. The loop stops at the first attempt meeting every
+    check, or when the iteration, token or time budget is spent. `complete` takes a message list
+    and returns (reply text, tokens used).
+    """
+
+    def __init__(self, python, complete, messages_for, target_speedup=10.0, max_iterations=6,
+                 token_budget=50000, time_budget=600, run_timeout=120, repeats=3, model_name="",
+                 log_path=REFINE_LOG, ignore=DEFAULT_IGNORE):
+        self.python = python
+        self.complete = complete
+        self.messages_for = messages_for
+        self.target_speedup = target_speedup
+        self.max_iterations = max_iterations
+        self.token_budget = token_budget
+        self.time_budget = time_budget
+        self.run_timeout = run_timeout
+        self.repeats = repeats
+        self.model_name = model_name
+        self.log_path = log_path
+        self.ignore = ignore
+        self.tokens = 0
+        self.best = None
+
+    def _log(self, record):
+        if self.log_path:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def baseline(self):
+        """Output and wall time of the Python program, run once as its own process"""
+        return timed_run([sys.executable, "-c", self.python], self.run_timeout)
+
+    def _check(self, cpp, build_dir, expected_output, python_seconds, record):
+        """Returns the feedback for the model, or None when the attempt meets every check"""
+        source = os.path.join(build_dir, "optimized.cpp")
+        binary = os.path.join(build_dir, "optimized")
+        with open(source, "w") as f:
+            f.write(cpp)
+
+        start = time.perf_counter()
+        try:
+            compile_cpp(source, binary)
+        except subprocess.CalledProcessError as e:
+            record["status"] = "compile_error"
+            return f"The C++ failed to compile:\n{_clip(e.stderr)}\nFix the errors and respond with the complete program."
+        finally:
+            record["compile_seconds"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            output, cpp_seconds = timed_run([binary], self.run_timeout, self.repeats)
+        except subprocess.TimeoutExpired:
+            record["status"] = "timeout"
+            return f"The C++ did not finish within {self.run_timeout} seconds. Respond with a faster complete program."
+        except subprocess.CalledProcessError as e:
+            record["status"] = "runtime_error"
+            return f"The C++ exited with code {e.returncode}:\n{_clip(e.stderr)}\nRespond with a fixed complete program."
+        finally:
+            record["run_seconds"] = time.perf_counter() - start
+
+        if not outputs_match(normalize_output(expected_output, self.ignore), normalize_output(output, self.ignore)):
+            record["status"] = "mismatch"
+            return (f"The C++ output does not match the Python output.\nPython printed:\n{_clip(expected_output)}\n"
+                    f"C++ printed:\n{_clip(output)}\nCheck number types for overflow and respond with the complete program.")
+
+        speedup = python_seconds / cpp_seconds if cpp_seconds else float("inf")
+        record["cpp_seconds"] = cpp_seconds
+        record["speedup"] = speedup
+        if self.best is None or speedup > self.best["speedup"]:
+            self.best = {"cpp": cpp, "speedup": speedup, "iteration": record["iteration"]}
+        if speedup < self.target_speedup:
+            record["status"] = "too_slow"
+            return (f"The output is correct, but the C++ takes {cpp_seconds:.4f} seconds against {python_seconds:.4f} "
+                    f"for the Python: a {speedup:.1f}x speedup where {self.target_speedup:.1f}x is needed. "
+                    "Respond with a faster complete program that prints the same output.")
+        record["status"] = "success"
+        return None
+
+    def run(self):
+        """Yields the record of every iteration; the last has status success or says which budget stopped it"""
+        start = time.perf_counter()
+        expected_output, python_seconds = self.baseline()
+        messages = self.messages_for(self.python)
+        with tempfile.TemporaryDirectory(prefix="refine-") as build_dir:
+            for iteration in range(1, self.max_iterations + 1):
+                record = {"iteration": iteration, "model": self.model_name, "python_seconds": python_seconds}
+                generate_start = time.perf_counter()
+                reply, tokens = self.complete(messages)
+                record["generate_seconds"] = time.perf_counter() - generate_start
+                self.tokens += tokens
+                record["tokens"] = tokens
+
+                cpp = extract_cpp(reply)
+                feedback = self._check(cpp, build_dir, expected_output, python_seconds, record)
+                record["elapsed_seconds"] = time.perf_counter() - start
+                record["total_tokens"] = self.tokens
+                record["cpp"] = cpp
+                if feedback is not None:
+                    if self.tokens >= self.token_budget:
+                        record["stopped"] = "token budget"
+                    elif record["elapsed_seconds"] >= self.time_budget:
+                        record["stopped"] = "time budget"
+                    elif iteration == self.max_iterations:
+                        record["stopped"] = "iteration limit"
+                self._log({key: value for key, value in record.items() if key != "cpp"})
+                yield record
+                if feedback is None or "stopped" in record:
+                    return
+                # Only the latest attempt goes back, so the prompt doesn't grow with every round
+                messages = self.messages_for(self.python) + [
+                    {"role": "assistant", "content": reply},
+                    {"role": "user", "content": feedback}
+                ]
+
+
+def format_record(record):
+    line = f"Iteration {record['iteration']}: {record['status']} after {record['generate_seconds']:.1f}s generating"
+    if "speedup" in record:
+        line += f", C++ {record['cpp_seconds']:.4f}s vs Python {record['python_seconds']:.4f}s = {record['speedup']:.1f}x"
+    line += f" ({record['total_tokens']} tokens, {record['elapsed_seconds']:.0f}s so far)"
+    if "stopped" in record:
+        line += f"; stopped: {record['stopped']} reached"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translate a Python program to C++, repairing and speeding it up until it meets the target")
+    parser.add_argument("python", help="Python source file")
+    parser.add_argument("--model", choices=["GPT", "Claude"], default="GPT")
+    parser.add_argument("--target-speedup", type=float, default=10.0)
+    parser.add_argument("--max-iterations", type=int, default=6)
+    parser.add_argument("--token-budget", type=int, default=50000)
+    parser.add_argument("--time-budget", type=float, default=600, help="seconds")
+    parser.add_argument("--output", default="optimized.cpp", help="where to write the best correct attempt")
+    args = parser.parse_args()
+
+    # Imported here so the module can be used without the UI's dependencies
+    from python_optimizer import complete_claude, complete_gpt, messages_for
+
+    with open(args.python) as f:
+        python = f.read()
+    refiner = Refiner(
+        python,
+        complete_gpt if args.model == "GPT" else complete_claude,
+        messages_for,
+        target_speedup=args.target_speedup,
+        max_iterations=args.max_iterations,
+        token_budget=args.token_budget,
+        time_budget=args.time_budget,
+        model_name=args.model
+    )
+    try:
+        for record in refiner.run():
+            print(format_record(record), file=sys.stderr)
+    except subprocess.CalledProcessError as e:
+        print(f"The Python failed:\n{e.stderr}", file=sys.stderr)
+        sys.exit(2)
+    except subprocess.TimeoutExpired:
+        print(f"The Python did not finish within {refiner.run_timeout} seconds", file=sys.stderr)
+        sys.exit(2)
+    if refiner.best is None:
+        print("No attempt compiled and matched the Python output", file=sys.stderr)
+        sys.exit(1)
+    with open(args.output, "w") as f:
+        f.write(refiner.best["cpp"])
+    print(f"Wrote iteration {refiner.best['iteration']} ({refiner.best['speedup']:.1f}x) to {args.output}", file=sys.stderr)
+    sys.exit(0 if refiner.best["speedup"] >= args.target_speedup else 1)
+
+
+if __name__ == "__main__":
+    main()
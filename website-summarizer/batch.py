@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import aiohttp
+from summarizer import WEB_HEADERS, Website, cache_stats, get_http_cache, limit_model_concurrency, summarize_website
+
+
+def read_urls(path):
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line in source:
+            url = line.strip()
+            if url and not url.startswith("#"):
+                yield url
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+def load_checkpoint(path):
+    """URLs that already have a summary in the output file; failed ones are retried"""
+    done = set()
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by an interrupted run
+                if "summary" in record:
+                    done.add(record["url"])
+    return done
+
+
+class BatchSummarizer:
+    """Two-stage pipeline: pooled concurrent fetching feeding a separately bounded Ollama stage.
+
+    The queue between the stages is bounded, so fetching never runs far ahead of the model.
+    """
+
+    def __init__(self, model, output, fetch_concurrency=32, per_host=4,
+                 summarize_concurrency=2, timeout=30):
+        self.model = model
+        self.output = output
+        self.fetch_concurrency = fetch_concurrency
+        self.per_host = per_host
+        self.summarize_concurrency = summarize_concurrency
+        self.timeout = timeout
+        self.stats = {"fetched": 0, "summarized": 0, "failed": 0}
+
+    def _write(self, record):
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+    async def _download(self, session, url):
+        http_cache = get_http_cache()
+        conditional = http_cache.conditional_headers(url)
+        async with session.get(url, headers=conditional) as response:
+            if response.status == 304:
+                content = http_cache.not_modified(url)
+                if content is not None:
+                    return content
+            else:
+                response.raise_for_status()
+                content = await response.read()
+                http_cache.store(url, response.headers, content, was_conditional=bool(conditional))
+                return content
+        # A 304 for a copy that was evicted in the meantime; download it in full
+        async with session.get(url) as response:
+            response.raise_for_status()
+            content = await response.read()
+            http_cache.store(url, response.headers, content)
+            return content
+
+    async def _fetch(self, session, url, pages, slots):
+        try:
+            content = await self._download(session, url)
+            # Parsing is CPU bound, keep it off the event loop
+            website = await asyncio.to_thread(Website, url, content)
+            self.stats["fetched"] += 1
+            await pages.put(website)
+        except Exception as e:
+            self.stats["failed"] += 1
+            self._write({"url": url, "error": f"fetch failed: {e}"})
+        finally:
+            slots.release()
+
+    async def _summarize(self, pages):
+        while True:
+            website = await pages.get()
+            if website is None:
+                return
+            try:
+                # Long pages are map-reduced, so one page can make several model calls
+                summary = await asyncio.to_thread(summarize_website, website, self.model)
+                self.stats["summarized"] += 1
+                self._write({"url": website.url, "title": website.title, "summary": summary})
+            except Exception as e:
+                self.stats["failed"] += 1
+                self._write({"url": website.url, "error": f"summarize failed: {e}"})
+
+    async def run(self, urls, skip=()):
+        # Map-reduced pages make their calls from a pool of their own; this keeps the total bounded
+        limit_model_concurrency(self.summarize_concurrency)
+        pages = asyncio.Queue(maxsize=self.summarize_concurrency * 2)
+        slots = asyncio.Semaphore(self.fetch_concurrency)
+        summarizers = [asyncio.create_task(self._summarize(pages)) for _ in range(self.summarize_concurrency)]
+
+        connector = aiohttp.TCPConnector(limit=self.fetch_concurrency, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        seen = set(skip)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=WEB_HEADERS) as session:
+            fetches = set()
+            for url in urls:
+                if url in seen:
+                    continue
+                seen.add(url)
+                await slots.acquire()
+                task = asyncio.create_task(self._fetch(session, url, pages, slots))
+                fetches.add(task)
+                task.add_done_callback(fetches.discard)
+            await asyncio.gather(*fetches)
+
+        for _ in summarizers:
+            await pages.put(None)
+        await asyncio.gather(*summarizers)
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a list of URLs into JSONL")
+    parser.add_argument("urls", help="file with one URL per line, or - for stdin")
+    parser.add_argument("model")
+    parser.add_argument("--output", help="JSONL output file; re-running with the same file resumes (default: stdout)")
+    parser.add_argument("--fetch-concurrency", type=int, default=32)
+    parser.add_argument("--per-host", type=int, default=4, help="concurrent requests per host")
+    parser.add_argument("--summarize-concurrency", type=int, default=2, help="concurrent Ollama requests")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds per page download")
+    args = parser.parse_args()
+
+    done = load_checkpoint(args.output)
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    batch = BatchSummarizer(
+        args.model,
+        output,
+        fetch_concurrency=args.fetch_concurrency,
+        per_host=args.per_host,
+        summarize_concurrency=args.summarize_concurrency,
+        timeout=args.timeout
+    )
+    start = time.time()
+    try:
+        stats = asyncio.run(batch.run(read_urls(args.urls), skip=done))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Summarized {stats['summarized']} pages ({stats['failed']} failed, {len(done)} already done) "
+          f"in {time.time() - start:.1f} seconds", file=sys.stderr)
+    print(f"Cache: {cache_stats()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
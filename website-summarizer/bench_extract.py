@@ -0,0 +1,88 @@
+import argparse
+import difflib
+import glob
+import os
+import random
+import time
+from extract import available_extractors, get_extractor
+
+WORDS = "the of and to in is was for on that with as by at from this be are or an it not which have has".split()
+
+
+def sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def synthetic_page(rng, paragraphs):
+    """A docs-like page with navigation, scripts, inline markup, entities, comments and tables"""
+    nav = "".join(f'<li><a href="/p{i}">Link {i}</a></li>' for i in range(rng.randint(5, 30)))
+    body = []
+    for i in range(paragraphs):
+        kind = rng.random()
+        if kind < 0.6:
+            body.append(f"<p>{sentence(rng, 20)} <b>{sentence(rng, 3)}</b> &amp; <a href='#'>{sentence(rng, 2)}</a></p>")
+        elif kind < 0.75:
+            body.append(f"<h2>{sentence(rng, 4)}</h2><!-- section {i} -->")
+        elif kind < 0.85:
+            rows = "".join(f"<tr><td>{rng.randint(0, 999)}</td><td>{sentence(rng, 3)}</td></tr>" for _ in range(5))
+            body.append(f"<table>{rows}</table>")
+        elif kind < 0.95:
+            body.append(f"<script>var x{i} = {rng.randint(0, 99)};</script><style>.c{i} {{ color: red }}</style>")
+        else:
+            body.append(f'<div><img src="i{i}.png" alt="image"><input type="text" value="v"> {sentence(rng, 6)}</div>')
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>{sentence(rng, 5)}</title></head><body>"
+        f"<header><nav><ul>{nav}</ul></nav></header><main>{''.join(body)}</main>"
+        f"<footer><p>Copyright {rng.randint(2000, 2030)}</p></footer></body></html>"
+    ).encode("utf-8")
+
+
+def load_corpus(directory, count, seed):
+    if directory:
+        paths = sorted(glob.glob(os.path.join(directory, "**", "*.htm*"), recursive=True))
+        pages = []
+        for path in paths:
+            with open(path, "rb") as f:
+                pages.append(f.read())
+        return pages
+    rng = random.Random(seed)
+    return [synthetic_page(rng, rng.choice([20, 100, 500, 2000])) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTML extractors for speed and output parity with bs4")
+    parser.add_argument("--corpus", help="directory of saved .html pages (default: synthetic pages)")
+    parser.add_argument("--pages", type=int, default=200, help="number of synthetic pages")
+    parser.add_argument("--boilerplate", action="store_true", help="also strip navigation and boilerplate")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, args.pages, args.seed)
+    megabytes = sum(len(page) for page in pages) / 1e6
+    print(f"{len(pages)} pages, {megabytes:.1f} MB")
+
+    results = {}
+    for name in available_extractors():
+        extractor = get_extractor(name)
+        start = time.perf_counter()
+        results[name] = [extractor(page, boilerplate=args.boilerplate) for page in pages]
+        elapsed = time.perf_counter() - start
+        print(f"{name:<11} {len(pages) / elapsed:8.1f} pages/s  {megabytes / elapsed:6.1f} MB/s")
+
+    reference = results.get("bs4")
+    if reference is None:
+        return
+    for name, outputs in results.items():
+        if name == "bs4":
+            continue
+        identical = sum(1 for ours, theirs in zip(outputs, reference) if ours == theirs)
+        similarity = sum(
+            difflib.SequenceMatcher(None, ours[1], theirs[1], autojunk=False).quick_ratio()
+            for ours, theirs in zip(outputs, reference)
+        ) / len(pages)
+        print(f"{name:<11} parity with bs4: {identical}/{len(pages)} identical, mean text similarity {similarity:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import requests
+
+
+def content_key(*parts):
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class DiskLRU:
+    """Size-bounded directory of files grouped by key, evicted least recently used first.
+
+    File modification times record recency, so the order survives restarts.
+    """
+
+    def __init__(self, directory, suffixes, max_bytes):
+        self.directory = directory
+        self.suffixes = suffixes
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> total size of its files
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        found = {}
+        for name in os.listdir(self.directory):
+            key, dot, suffix = name.partition(".")
+            if dot and suffix in self.suffixes:
+                stat = os.stat(os.path.join(self.directory, name))
+                mtime, size = found.get(key, (0, 0))
+                found[key] = (max(mtime, stat.st_mtime), size + stat.st_size)
+        for key, (_, size) in sorted(found.items(), key=lambda item: item[1][0]):
+            self._entries[key] = size
+            self._size += size
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def touch(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._entries.move_to_end(key)
+        try:
+            os.utime(self.path(key, self.suffixes[0]))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def write(self, key, files):
+        """files maps suffix -> bytes; all are replaced atomically one by one"""
+        size = 0
+        for suffix, data in files.items():
+            path = self.path(key, suffix)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            size += len(data)
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                evicted, evicted_size = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+                self._remove(evicted)
+
+    def discard(self, key):
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._remove(key)
+
+    def _remove(self, key):
+        for suffix in self.suffixes:
+            try:
+                os.remove(self.path(key, suffix))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SummaryCache:
+    """Summaries on disk, one file per content hash, size-bounded with LRU eviction"""
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self._store = DiskLRU(directory, ("md",), max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # guards the counters, which every worker thread updates
+
+    def get(self, key):
+        summary = None
+        if self._store.touch(key):
+            try:
+                with open(self._store.path(key, "md"), encoding="utf-8") as f:
+                    summary = f.read()
+            except FileNotFoundError:
+                self._store.discard(key)
+        with self._lock:
+            if summary is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return summary
+
+    def put(self, key, summary):
+        self._store.write(key, {"md": summary.encode("utf-8")})
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self._store),
+            "bytes": self._store.size,
+            "evictions": self._store.evictions
+        }
+
+
+class HttpCache:
+    """On-disk HTTP response cache revalidated with ETag / Last-Modified conditional requests.
+
+    Only responses carrying a validator are stored. A 304 answer reuses the stored body, so an
+    unchanged page costs one round trip and no download.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self._store = DiskLRU(directory, ("json", "body"), max_bytes)
+        self.requests = 0
+        self.revalidated = 0
+        self.changed = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # guards the counters, which every worker thread updates
+
+    def _key(self, url):
+        return content_key(url)
+
+    def _metadata(self, key):
+        try:
+            with open(self._store.path(key, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def conditional_headers(self, url):
+        """Validator headers to send for url, empty if nothing is cached"""
+        metadata = self._metadata(self._key(url))
+        headers = {}
+        if metadata:
+            if metadata.get("etag"):
+                headers["If-None-Match"] = metadata["etag"]
+            if metadata.get("last_modified"):
+                headers["If-Modified-Since"] = metadata["last_modified"]
+        return headers
+
+    def not_modified(self, url):
+        """Body to use after a 304 response, or None if the cached copy has disappeared"""
+        key = self._key(url)
+        try:
+            with open(self._store.path(key, "body"), "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            self._store.discard(key)
+            self._count("misses")
+            return None
+        self._store.touch(key)
+        self._count("revalidated")
+        return body
+
+    def _count(self, outcome):
+        with self._lock:
+            self.requests += 1
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def store(self, url, headers, body, was_conditional=False):
+        """Record a 200 response; headers is any case-insensitive mapping"""
+        self._count("changed" if was_conditional else "misses")
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        metadata = {"url": url, "etag": etag, "last_modified": last_modified}
+        self._store.write(self._key(url), {
+            "json": json.dumps(metadata).encode("utf-8"),
+            "body": body
+        })
+
+    def fetch(self, url, headers=None, timeout=30):
+        """GET url with requests, revalidating any cached copy"""
+        conditional = self.conditional_headers(url)
+        response = requests.get(url, headers={**(headers or {}), **conditional}, timeout=timeout)
+        if response.status_code == 304:
+            body = self.not_modified(url)
+            if body is not None:
+                return body
+            response = requests.get(url, headers=headers, timeout=timeout)
+            conditional = {}
+        response.raise_for_status()
+        self.store(url, response.headers, response.content, was_conditional=bool(conditional))
+        return response.content
+
+    def stats(self):
+        with self._lock:
+            requests, revalidated = self.requests, self.revalidated
+            changed, misses = self.changed, self.misses
+        return {
+            "requests": requests,
+            "revalidated": revalidated,
+            "changed": changed,
+            "misses": misses,
+            "hit_rate": revalidated / requests if requests else 0.0,
+            "entries": len(self._store),
+            "bytes": self._store.size,
+            "evictions": self._store.evictions
+        }
@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import json
+import posixpath
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+import requests
+from extract import extract_links
+from mapreduce import MapReduceSummarizer
+from summarizer import (
+    WEB_HEADERS, Website, cache_stats, chat, get_http_cache, get_summary_cache, limit_model_concurrency, summarize_website
+)
+
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|ref_src)$", re.IGNORECASE)
+INDEX_PAGES = ("index.html", "index.htm", "index.php", "default.aspx")
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".zip", ".gz", ".tar", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico",
+    ".css", ".js", ".json", ".xml", ".mp3", ".mp4", ".woff", ".woff2", ".ttf"
+)
+WORD_RE = re.compile(r"\w+")
+
+
+def canonicalize_url(url, base=None):
+    """Absolute http(s) URL with the parts that don't change the page normalized away, or None"""
+    try:
+        if base:
+            url = urljoin(base, url)
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https") or not parts.hostname:
+            return None
+        port = parts.port
+    except ValueError:
+        # Malformed hrefs such as "http://host:abc/" or "http://[::1" are skipped like any other bad link
+        return None
+    host = parts.hostname.lower()
+    if port and port != {"http": 80, "https": 443}[scheme]:
+        host = f"{host}:{port}"
+
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    trailing_slash = path.endswith("/")
+    path = posixpath.normpath(path)
+    if path.rsplit("/", 1)[1] in INDEX_PAGES:
+        path, trailing_slash = path.rsplit("/", 1)[0], True
+    if trailing_slash and not path.endswith("/"):
+        path += "/"
+
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAMS.match(key)
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def simhash(text, bits=64):
+    """SimHash over word trigrams; near-identical texts differ in only a few bits"""
+    words = WORD_RE.findall(text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))]
+    weights = [0] * bits
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=bits // 8).digest(), "big")
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+
+class SimHashIndex:
+    """Finds a stored fingerprint within max_distance bits.
+
+    The 64 bits are split into max_distance + 1 bands; two fingerprints that differ in at most
+    max_distance bits must agree exactly on at least one band, so only those buckets are checked.
+    """
+
+    def __init__(self, max_distance=3, bits=64):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = bits // self.bands
+        self._buckets = [{} for _ in range(self.bands)]
+
+    def _band_values(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (band * self.band_bits)) & mask for band in range(self.bands)]
+
+    def find(self, fingerprint):
+        for band, value in enumerate(self._band_values(fingerprint)):
+            for other, url in self._buckets[band].get(value, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return url
+        return None
+
+    def add(self, fingerprint, url):
+        for band, value in enumerate(self._band_values(fingerprint)):
+            self._buckets[band].setdefault(value, []).append((fingerprint, url))
+
+
+class Crawler:
+    """Breadth-first crawl of one site, skipping pages that are near-duplicates of pages already seen"""
+
+    def __init__(self, start_url, max_depth=2, max_pages=50, whole_host=False,
+                 fetch_concurrency=4, near_duplicate_bits=3, respect_robots=True):
+        self.start_url = canonicalize_url(start_url)
+        if self.start_url is None:
+            raise ValueError(f"Not an http(s) URL: {start_url}")
+        start = urlsplit(self.start_url)
+        self.host = start.netloc
+        self.prefix = "/" if whole_host else start.path.rsplit("/", 1)[0] + "/"
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.fetch_concurrency = fetch_concurrency
+        self.duplicates = SimHashIndex(near_duplicate_bits)
+        self.robots = self._load_robots(start) if respect_robots else None
+        self.crawl_delay = (self.robots.crawl_delay(WEB_HEADERS["User-Agent"]) or 0) if self.robots else 0
+
+    def _load_robots(self, start):
+        robots = RobotFileParser()
+        try:
+            response = requests.get(f"{start.scheme}://{start.netloc}/robots.txt", headers=WEB_HEADERS, timeout=10)
+            # No robots.txt (or a broken one) means everything is allowed
+            robots.parse(response.text.splitlines() if response.status_code == 200 else [])
+        except requests.RequestException:
+            robots.parse([])
+        return robots
+
+    def in_scope(self, url):
+        parts = urlsplit(url)
+        if parts.netloc != self.host or not parts.path.startswith(self.prefix):
+            return False
+        if parts.path.lower().endswith(SKIPPED_EXTENSIONS):
+            return False
+        return self.robots is None or self.robots.can_fetch(WEB_HEADERS["User-Agent"], url)
+
+    def _fetch(self, url):
+        try:
+            content = get_http_cache().fetch(url, headers=WEB_HEADERS)
+            return Website(url, content), extract_links(content), None
+        except Exception as e:
+            return None, [], str(e)
+
+    def crawl(self):
+        """Return (pages, duplicates, errors); pages carry url, parent, depth and the parsed Website"""
+        pages, duplicates, errors = [], [], []
+        seen = {self.start_url}
+        frontier = deque([(self.start_url, None, 0)])
+        # A crawl delay means fetching one page at a time
+        concurrency = 1 if self.crawl_delay else self.fetch_concurrency
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while frontier and len(pages) < self.max_pages:
+                batch = [frontier.popleft() for _ in range(min(len(frontier), self.max_pages - len(pages), concurrency))]
+                results = list(pool.map(lambda item: self._fetch(item[0]), batch))
+                if self.crawl_delay:
+                    time.sleep(self.crawl_delay)
+
+                for (url, parent, depth), (website, links, error) in zip(batch, results):
+                    if error:
+                        errors.append({"url": url, "error": error})
+                        continue
+                    fingerprint = simhash(website.text)
+                    original = self.duplicates.find(fingerprint)
+                    if original:
+                        # Printer versions and paginated copies: not summarized, links not followed
+                        duplicates.append({"url": url, "duplicate_of": original})
+                        continue
+                    self.duplicates.add(fingerprint, url)
+                    pages.append({"url": url, "parent": parent, "depth": depth, "website": website})
+
+                    if depth < self.max_depth:
+                        for link in links:
+                            link = canonicalize_url(link, base=url)
+                            if link and link not in seen and self.in_scope(link):
+                                seen.add(link)
+                                frontier.append((link, url, depth + 1))
+        return pages, duplicates, errors
+
+
+def summarize_site(pages, model, concurrency=2):
+    """Summarize every page, then the whole site, and arrange the pages as the tree they were found in.
+
+    concurrency bounds the model requests in flight, counting the map-reduce calls of long pages.
+    """
+    limit_model_concurrency(concurrency)
+
+    def summarize_page(page):
+        # One failed model call costs that page its summary, not the whole tree
+        try:
+            return summarize_website(page["website"], model), None
+        except Exception as e:
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(summarize_page, pages))
+
+    nodes = {}
+    roots = []
+    for page, (summary, error) in zip(pages, results):
+        node = {"url": page["url"], "title": page["website"].title, "summary": summary, "children": []}
+        if error:
+            node["error"] = error
+        nodes[page["url"]] = node
+        parent = nodes.get(page["parent"])
+        (parent["children"] if parent else roots).append(node)
+
+    site_title = pages[0]["website"].title if pages else ""
+    summaries = [summary for summary, _ in results if summary is not None]
+    if len(summaries) > 1:
+        site_summary = MapReduceSummarizer(chat, model, cache=get_summary_cache()).merge(site_title, summaries)
+    else:
+        site_summary = summaries[0] if summaries else ""
+    return {"title": site_title, "summary": site_summary, "pages": roots}
+
+
+def iter_nodes(nodes):
+    for node in nodes:
+        yield node
+        yield from iter_nodes(node["children"])
+
+
+def tree_to_markdown(tree):
+    lines = [f"# {tree['title']}", "", tree["summary"], ""]
+
+    def add(node, level):
+        lines.append(f"{'#' * min(level, 6)} [{node['title']}]({node['url']})")
+        lines.extend(["", node["summary"] if "error" not in node else f"_Summary failed: {node['error']}_", ""])
+        for child in node["children"]:
+            add(child, level + 1)
+
+    for root in tree["pages"]:
+        add(root, 2)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl a site breadth-first and summarize it as a tree")
+    parser.add_argument("url")
+    parser.add_argument("model")
+    parser.add_argument("--depth", type=int, default=2, help="maximum link depth from the start page")
+    parser.add_argument("--max-pages", type=int, default=50)
+    parser.add_argument("--whole-host", action="store_true", help="crawl the whole host, not just below the start path")
+    parser.add_argument("--ignore-robots", action="store_true")
+    parser.add_argument("--fetch-concurrency", type=int, default=4)
+    parser.add_argument("--summarize-concurrency", type=int, default=2, help="concurrent Ollama requests")
+    parser.add_argument("--format", choices=["json", "markdown"], default="markdown")
+    args = parser.parse_args()
+
+    start = time.time()
+    crawler = Crawler(
+        args.url,
+        max_depth=args.depth,
+        max_pages=args.max_pages,
+        whole_host=args.whole_host,
+        fetch_concurrency=args.fetch_concurrency,
+        respect_robots=not args.ignore_robots
+    )
+    pages, duplicates, errors = crawler.crawl()
+    print(f"Crawled {len(pages)} pages, skipped {len(duplicates)} near-duplicates, "
+          f"{len(errors)} errors in {time.time() - start:.1f} seconds", file=sys.stderr)
+
+    tree = summarize_site(pages, args.model, args.summarize_concurrency)
+    failed = sum(1 for page in iter_nodes(tree["pages"]) if "error" in page)
+    if failed:
+        print(f"{failed} of {len(pages)} pages could not be summarized", file=sys.stderr)
+    if args.format == "json":
+        tree["duplicates"] = duplicates
+        tree["errors"] = errors
+        print(json.dumps(tree, indent=2, ensure_ascii=False))
+    else:
+        print(tree_to_markdown(tree))
+    print(f"Done in {time.time() - start:.1f} seconds. Cache: {cache_stats()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import codecs
+import re
+
+IRRELEVANT_TAGS = ("script", "style", "img", "input")
+BOILERPLATE_TAGS = ("nav", "header", "footer", "aside", "form", "noscript", "iframe", "svg", "button", "select")
+NO_TITLE = "No title found"
+CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def skipped_tags(boilerplate):
+    return frozenset(IRRELEVANT_TAGS + (BOILERPLATE_TAGS if boilerplate else ()))
+
+
+def detect_encoding(content):
+    """UTF-8 when the bytes decode as UTF-8, else the page's declared charset, else cp1252"""
+    try:
+        content.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    match = CHARSET_RE.search(content[:4096])
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    return "cp1252"
+
+
+def extract_bs4(content, boilerplate=False):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    title = soup.title.string if soup.title else NO_TITLE
+    body = soup.body or soup
+    for irrelevant in body(list(skipped_tags(boilerplate))):
+        irrelevant.decompose()
+    return title, body.get_text(separator="\n", strip=True)
+
+
+def extract_lxml(content, boilerplate=False):
+    from lxml import etree, html
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    if not content.strip():
+        return NO_TITLE, ""
+    parser = html.HTMLParser(encoding=detect_encoding(content))
+    root = html.document_fromstring(content, parser=parser)
+    title_element = root.find(".//title")
+    if title_element is None:
+        title = NO_TITLE
+    else:
+        title = title_element.text if len(title_element) == 0 else None
+    body = root.find("body")
+    if body is None:
+        body = root
+
+    skip = skipped_tags(boilerplate)
+    parts = []
+    walker = etree.iterwalk(body, events=("start", "end", "comment", "pi"))
+    for event, element in walker:
+        if event == "start":
+            if element.tag in skip:
+                walker.skip_subtree()
+            elif element.text:
+                parts.append(element.text)
+        # Comments and processing instructions only contribute the text that follows them
+        elif element is not body and element.tail:
+            parts.append(element.tail)
+    return title, "\n".join(stripped for stripped in (part.strip() for part in parts) if stripped)
+
+
+def extract_selectolax(content, boilerplate=False):
+    from selectolax.lexbor import LexborHTMLParser
+    if isinstance(content, bytes):
+        content = content.decode(detect_encoding(content), errors="replace")
+    tree = LexborHTMLParser(content)
+    title_node = tree.css_first("title")
+    title = (title_node.text() or None) if title_node is not None else NO_TITLE
+    body = tree.body or tree.root
+    if body is None:
+        return title, ""
+
+    tree.strip_tags(list(skipped_tags(boilerplate)))
+    parts = []
+    for node in body.traverse(include_text=True):
+        if node.tag == "-text":
+            text = node.text_content.strip()
+            if text:
+                parts.append(text)
+    return title, "\n".join(parts)
+
+
+# bs4 is the original html.parser path and the parity reference; lxml and selectolax give the
+# same output but skip unwanted subtrees while walking instead of decomposing them first
+EXTRACTORS = {
+    "selectolax": extract_selectolax,
+    "lxml": extract_lxml,
+    "bs4": extract_bs4,
+}
+
+
+def available_extractors():
+    names = []
+    for name, module in (("selectolax", "selectolax"), ("lxml", "lxml"), ("bs4", "bs4")):
+        try:
+            __import__(module)
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+
+def get_extractor(name=None):
+    """Return the named extractor, or the fastest one that is installed"""
+    if name is not None:
+        return EXTRACTORS[name]
+    available = available_extractors()
+    if not available:
+        raise ImportError("Install selectolax, lxml or beautifulsoup4 to extract page text")
+    return EXTRACTORS[available[0]]
+
+
+def extract_links(content):
+    """href values of every <a> on the page, in document order, using the fastest installed parser"""
+    available = available_extractors()
+    if "selectolax" in available:
+        from selectolax.lexbor import LexborHTMLParser
+        if isinstance(content, bytes):
+            content = content.decode(detect_encoding(content), errors="replace")
+        return [node.attributes["href"] for node in LexborHTMLParser(content).css("a[href]") if node.attributes["href"]]
+    if "lxml" in available:
+        from lxml import html
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        if not content.strip():
+            return []
+        root = html.document_fromstring(content, parser=html.HTMLParser(encoding=detect_encoding(content)))
+        return root.xpath("//a/@href")
+    from bs4 import BeautifulSoup
+    return [a["href"] for a in BeautifulSoup(content, 'html.parser').find_all("a", href=True)]
@@ -0,0 +1,132 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cache import content_key
+
+# Bump when the map or reduce prompts change so cached chunk summaries are not reused
+PROMPT_VERSION = "1"
+CHARS_PER_TOKEN = 4
+
+map_system_prompt = "You are an assistant that summarizes one part of a longer website, \
+ignoring text that might be navigation related. Respond in markdown."
+
+reduce_system_prompt = "You are an assistant that combines summaries of consecutive parts of a website \
+into one short summary of the whole website. Respond in markdown."
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _is_boundary(line, divisor):
+    digest = hashlib.blake2b(line.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") % divisor == 0
+
+
+def chunk_text(text, max_tokens=1500, min_tokens=400, boundary_divisor=8):
+    """Split text on line breaks into chunks of at most max_tokens.
+
+    Past min_tokens a chunk ends at any line whose hash hits the boundary condition. Because that
+    decision depends on the line itself rather than its position, an edit only changes the chunks
+    around it and the rest keep their content (and their cached summaries).
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    lines = []
+    for line in text.split("\n"):
+        # A single line longer than a chunk is cut into chunk-sized pieces
+        lines.extend(line[i:i + max_chars] for i in range(0, max(len(line), 1), max_chars))
+
+    chunks, current, current_tokens = [], [], 0
+    for line in lines:
+        tokens = estimate_tokens(line) + 1
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += tokens
+        if current_tokens >= min_tokens and _is_boundary(line, boundary_divisor):
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class MapReduceSummarizer:
+    """Summarizes chunks concurrently, then merges the partial summaries.
+
+    `chat` is a callable taking (model, messages) and returning the reply text. Chunk summaries
+    are cached by a hash of the model, prompt version, title and chunk text.
+    """
+
+    def __init__(self, chat, model, cache=None, chunk_tokens=1500, min_chunk_tokens=400, concurrency=4):
+        self.chat = chat
+        self.model = model
+        self.cache = cache
+        self.chunk_tokens = chunk_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+        self.concurrency = concurrency
+        self.last_stats = {}
+        self._lock = threading.Lock()
+
+    def _count(self, stat):
+        with self._lock:
+            self.last_stats[stat] += 1
+
+    def _cached_chat(self, kind, system_prompt, user_prompt):
+        key = content_key(self.model, PROMPT_VERSION, kind, user_prompt)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._count("cached")
+                return cached
+        summary = self.chat(self.model, [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ])
+        self._count("model_calls")
+        if self.cache is not None:
+            self.cache.put(key, summary)
+        return summary
+
+    def _summarize_chunk(self, title, chunk):
+        user_prompt = f"This is part of a website titled {title}. \
+Summarize this part in a few bullet points, keeping any news or announcements.\n\n{chunk}"
+        return self._cached_chat("map", map_system_prompt, user_prompt)
+
+    def _combine(self, title, summaries):
+        parts = "\n\n".join(f"Part {i}:\n{summary}" for i, summary in enumerate(summaries, 1))
+        user_prompt = f"These are summaries of consecutive parts of a website titled {title}. \
+Combine them into a short summary of the whole website in markdown. \
+If it includes news or announcements, then summarize these too.\n\n{parts}"
+        return self._cached_chat("reduce", reduce_system_prompt, user_prompt)
+
+    def _reduce(self, title, summaries, pool):
+        # Partial summaries that don't fit one prompt are merged in groups first
+        while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries)) > self.chunk_tokens:
+            groups, group, group_tokens = [], [], 0
+            for summary in summaries:
+                tokens = estimate_tokens(summary)
+                if group and group_tokens + tokens > self.chunk_tokens:
+                    groups.append(group)
+                    group, group_tokens = [], 0
+                group.append(summary)
+                group_tokens += tokens
+            groups.append(group)
+            if len(groups) == len(summaries):
+                break  # every summary is already as big as a prompt; merge them as they are
+            summaries = list(pool.map(lambda g: self._combine(title, g) if len(g) > 1 else g[0], groups))
+        return self._combine(title, summaries)
+
+    def merge(self, title, summaries):
+        """Combine already written summaries, e.g. of several pages, into one"""
+        self.last_stats = {"chunks": len(summaries), "cached": 0, "model_calls": 0}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return self._reduce(title, list(summaries), pool)
+
+    def summarize(self, title, text):
+        chunks = chunk_text(text, self.chunk_tokens, self.min_chunk_tokens)
+        self.last_stats = {"chunks": len(chunks), "cached": 0, "model_calls": 0}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            partials = list(pool.map(lambda chunk: self._summarize_chunk(title, chunk), chunks))
+            return self._reduce(title, partials, pool)
@@ -0,0 +1,249 @@
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from summarizer import (
+    CONTEXT_TOKENS, KEEP_ALIVE, Website, cache_stats, fits_single_prompt, get_client, get_summary_cache,
+    limit_model_concurrency, map_reduce_website, messages_for, model_slot, summary_key
+)
+
+DONE = object()
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """One summary request; the worker puts text pieces on `events` and finishes with DONE"""
+
+    def __init__(self, url):
+        self.url = url
+        self.events = queue.Queue()
+        self.submitted = time.perf_counter()
+        self.metrics = {}
+        self.error = None
+
+    def __iter__(self):
+        while True:
+            event = self.events.get()
+            if event is DONE:
+                return
+            yield event
+
+
+class SummarizerService:
+    """Keeps one model loaded in Ollama and summarizes queued URLs, streaming the tokens back.
+
+    A small bounded queue sits in front of the workers: a full queue rejects new requests instead
+    of letting them wait behind a long backlog. Requests share the summarizer's page, chunk and
+    HTTP caches, so a repeated or unchanged page is answered without calling the model.
+    """
+
+    def __init__(self, model, workers=1, queue_size=8):
+        self.model = model
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._recent = []  # metrics of the last few jobs, for /stats
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        limit_model_concurrency(workers)
+
+    def warm(self):
+        """Load the model now rather than on the first request; returns the seconds it took"""
+        start = time.perf_counter()
+        # An empty prompt only loads the model and sets how long it stays loaded
+        get_client().generate(model=self.model, prompt="", keep_alive=KEEP_ALIVE)
+        return time.perf_counter() - start
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, url):
+        job = Job(url)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            raise QueueFull(f"{self.jobs.maxsize} requests already queued")
+        return job
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                self._run(job)
+            except Exception as e:
+                job.error = str(e)
+            finally:
+                job.metrics["total_seconds"] = time.perf_counter() - job.submitted
+                with self._lock:
+                    if job.error:
+                        self.failed += 1
+                    else:
+                        self.completed += 1
+                        self._recent = (self._recent + [job.metrics])[-50:]
+                job.events.put(DONE)
+                self.jobs.task_done()
+
+    def _run(self, job):
+        started = time.perf_counter()
+        job.metrics["queue_seconds"] = started - job.submitted
+        website = Website(job.url)
+        key = summary_key(website, self.model)
+
+        summary = get_summary_cache().get(key)
+        if summary is not None:
+            job.metrics["source"] = "cache"
+        elif not fits_single_prompt(website):
+            # Map-reduce makes several model calls; only the final merged summary is sent.
+            # The page cache was already checked above, so it isn't asked (and counted) again.
+            summary = map_reduce_website(website, self.model)
+            get_summary_cache().put(key, summary)
+            job.metrics["source"] = "map_reduce"
+        else:
+            summary = self._stream(job, website)
+            get_summary_cache().put(key, summary)
+            job.metrics["source"] = "model"
+            return
+        job.metrics["time_to_first_token"] = time.perf_counter() - job.submitted
+        job.events.put(summary)
+
+    def _stream(self, job, website):
+        parts = []
+        with model_slot():
+            stream = get_client().chat(
+                model=self.model,
+                messages=messages_for(website),
+                stream=True,
+                keep_alive=KEEP_ALIVE,
+                options={"num_ctx": CONTEXT_TOKENS}
+            )
+            for chunk in stream:
+                token = chunk["message"]["content"]
+                if token:
+                    if not parts:
+                        job.metrics["time_to_first_token"] = time.perf_counter() - job.submitted
+                    parts.append(token)
+                    job.events.put(token)
+                if chunk.get("done"):
+                    # Ollama reports the generation itself in nanoseconds, excluding prompt processing
+                    eval_count = chunk.get("eval_count") or 0
+                    eval_duration = chunk.get("eval_duration") or 0
+                    job.metrics["tokens"] = eval_count
+                    job.metrics["tokens_per_second"] = eval_count / (eval_duration / 1e9) if eval_duration else None
+                    job.metrics["load_seconds"] = (chunk.get("load_duration") or 0) / 1e9
+        return "".join(parts)
+
+    def stats(self):
+        with self._lock:
+            recent = list(self._recent)
+            stats = {"model": self.model, "queued": self.jobs.qsize(), "queue_size": self.jobs.maxsize,
+                     "completed": self.completed, "failed": self.failed}
+
+        def mean(jobs, name):
+            values = [metrics[name] for metrics in jobs if metrics.get(name) is not None]
+            return sum(values) / len(values) if values else None
+
+        # Cached, streamed and map-reduced answers have very different latencies, so each gets its own means
+        by_source = {}
+        for metrics in recent:
+            by_source.setdefault(metrics.get("source", "unknown"), []).append(metrics)
+        stats["recent"] = {"jobs": len(recent)}
+        for source, jobs in sorted(by_source.items()):
+            stats["recent"][source] = {
+                "jobs": len(jobs),
+                "mean_time_to_first_token": mean(jobs, "time_to_first_token"),
+                "mean_tokens_per_second": mean(jobs, "tokens_per_second"),
+                "mean_total_seconds": mean(jobs, "total_seconds")
+            }
+        stats["cache"] = cache_stats()
+        return stats
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send_json(200, service.stats())
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/summarize":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                url = json.loads(self.rfile.read(length) or b"{}")["url"]
+            except (ValueError, KeyError, TypeError):
+                self._send_json(400, {"error": 'expected a JSON body like {"url": "https://..."}'})
+                return
+            try:
+                job = service.submit(url)
+            except QueueFull as e:
+                self._send_json(503, {"error": str(e)})
+                return
+
+            # Newline-delimited JSON: {"token": ...} lines, then one {"done": true, ...} line
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for token in job:
+                    self._write_chunk({"token": token})
+                self._write_chunk({"done": True, "error": job.error, "metrics": job.metrics})
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client went away; the worker still finishes and caches the summary
+
+        def _write_chunk(self, body):
+            data = json.dumps(body).encode("utf-8") + b"\n"
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            print(f"{self.address_string()} {format % args}", file=sys.stderr)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve website summaries from a model kept loaded in Ollama")
+    parser.add_argument("model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="concurrent model requests")
+    parser.add_argument("--queue-size", type=int, default=8, help="requests waiting before new ones get a 503")
+    args = parser.parse_args()
+
+    service = SummarizerService(args.model, workers=args.workers, queue_size=args.queue_size)
+    print(f"Loaded {args.model} in {service.warm():.1f} seconds (keep_alive {KEEP_ALIVE})", file=sys.stderr)
+    service.start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Listening on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,73 @@
 import sys
 import os
-import requests
+import threading
+from contextlib import nullcontext
 from ollama import Client
-from bs4 import BeautifulSoup
-from IPython.display import Markdown, display
+from extract import get_extractor
+from cache import HttpCache, SummaryCache, content_key
+from mapreduce import PROMPT_VERSION, MapReduceSummarizer, estimate_tokens
 
-if len(sys.argv) < 3:
-    print("Usage: python summarizer.py <url> <model>")
-    sys.exit(1)
+OLLAMA_HOST = 'http://localhost:11434'
+# Context window requested from Ollama; pages that don't fit in one prompt are map-reduced
+CONTEXT_TOKENS = int(os.getenv("SUMMARIZER_CONTEXT_TOKENS", "4096"))
+CHUNK_TOKENS = CONTEXT_TOKENS // 2
+# How long Ollama keeps the model loaded after a request, so the next one skips the load
+KEEP_ALIVE = os.getenv("SUMMARIZER_KEEP_ALIVE", "30m")
+CACHE_DIR = os.getenv("SUMMARIZER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".summarizer_cache"))
 
-client = Client(host='http://localhost:11434')
+# Created on first use so importing this module stays cheap and side-effect free
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Client(host=OLLAMA_HOST)
+        return _client
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def _cache(name, create):
+    # Like the client, each cache (and its directory) is only created when first needed
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = create()
+        return _caches[name]
+
+def get_http_cache():
+    return _cache("http", lambda: HttpCache(
+        os.path.join(CACHE_DIR, "http"),
+        max_bytes=int(os.getenv("SUMMARIZER_HTTP_CACHE_MB", "256")) * 1024 * 1024
+    ))
+
+def get_summary_cache():
+    return _cache("summaries", lambda: SummaryCache(os.path.join(CACHE_DIR, "pages")))
+
+def get_chunk_cache():
+    return _cache("chunks", lambda: SummaryCache(os.path.join(CACHE_DIR, "chunks")))
 
 WEB_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36'
 }
 
+# selectolax, lxml or bs4; the fastest installed one when unset
+EXTRACTOR = os.getenv("SUMMARIZER_EXTRACTOR")
+
 class Website:
-    def __init__(self, url):
+    def __init__(self, url, content=None, extractor=None):
         """
-        Create this Website object from the given url using the BeautifulSoup library.
+        Create this Website object from the given url, extracting the title and text with the
+        fastest available HTML parser. Navigation and other boilerplate are dropped during extraction.
+        Pass the already downloaded page as content to skip the request; otherwise a cached
+        copy is revalidated with a conditional GET.
         """
         self.url = url
-        response = requests.get(url, headers=WEB_HEADERS)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        self.title = soup.title.string if soup.title else "No title found"
-        for irrelevant in soup.body(["script", "style", "img", "input"]):
-            irrelevant.decompose()
-        self.text = soup.body.get_text(separator="\n", strip=True)
+        if content is None:
+            content = get_http_cache().fetch(url, headers=WEB_HEADERS)
+        extract = extractor or get_extractor(EXTRACTOR)
+        self.title, self.text = extract(content, boilerplate=True)
 
 system_prompt = "You are an assistant that analyzes the contents of a website \
 and provides a short summary, ignoring text that might be navigation related. \
@@ -46,16 +87,66 @@ def messages_for(website):
         { "role": "user", "content": user_prompt_for(website) }
     ]
 
+# Bounds concurrent Ollama requests across every caller in the process, including the map-reduce
+# pools inside each summary; unlimited until a front end sets it
+_model_slots = None
+
+def limit_model_concurrency(limit):
+    global _model_slots
+    _model_slots = threading.BoundedSemaphore(limit) if limit else None
+
+def model_slot():
+    return _model_slots or nullcontext()
+
+def chat(model, messages):
+    with model_slot():
+        response = get_client().chat(model=model, messages=messages, options={"num_ctx": CONTEXT_TOKENS}, keep_alive=KEEP_ALIVE)
+    return response['message']['content']
+
+def summary_key(website, model):
+    # Same extracted text and model means the same summary, whatever the page bytes looked like
+    return content_key(model, PROMPT_VERSION, system_prompt, str(CHUNK_TOKENS), str(website.title), website.text)
+
+def fits_single_prompt(website):
+    # Leave room in the context window for the instructions and the reply
+    return estimate_tokens(website.text) <= CHUNK_TOKENS
+
+def map_reduce_website(website, model):
+    # For pages that don't fit one prompt; uncached at the page level, chunk summaries are cached
+    return MapReduceSummarizer(chat, model, cache=get_chunk_cache(), chunk_tokens=CHUNK_TOKENS).summarize(website.title, website.text)
+
+def summarize_website(website, model):
+    key = summary_key(website, model)
+    summary_cache = get_summary_cache()
+    summary = summary_cache.get(key)
+    if summary is not None:
+        return summary
+    if fits_single_prompt(website):
+        summary = chat(model, messages_for(website))
+    else:
+        summary = map_reduce_website(website, model)
+    summary_cache.put(key, summary)
+    return summary
+
+def cache_stats():
+    # Only the caches this run used; asking must not create the others
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
+
 def summarize(url, model):
     website = Website(url)
-    response = client.chat(model=model, messages=messages_for(website))
-    return response['message']['content']
+    return summarize_website(website, model)
 
 def display_summary(url, model):
     summary = summarize(url, model)
     print(summary)
 
 if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python summarizer.py <url> <model>")
+        sys.exit(1)
     url = sys.argv[1]
     model = sys.argv[2]
     display_summary(url, model)
+    print(f"Cache: {cache_stats()}", file=sys.stderr)
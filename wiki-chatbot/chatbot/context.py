@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import re
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), good enough for budgeting"""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+def _hash_token(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+class ContextPacker:
+    """Post-retrieval stage: drops near-duplicate chunks, reranks with MMR and packs into a token budget"""
+
+    def __init__(self, token_budget=1500, shingle_size=5, num_permutations=64,
+                 duplicate_threshold=0.8, mmr_lambda=0.7, min_passage_tokens=64):
+        self.token_budget = token_budget
+        self.shingle_size = shingle_size
+        self.duplicate_threshold = duplicate_threshold
+        self.mmr_lambda = mmr_lambda
+        self.min_passage_tokens = min_passage_tokens
+
+        # Fixed seeds keep signatures stable across processes and requests
+        seed = hashlib.sha256(b"context-packer").digest()
+        self._permutations = []
+        for i in range(num_permutations):
+            digest = hashlib.sha256(seed + i.to_bytes(4, "big")).digest()
+            a = int.from_bytes(digest[:8], "big") % _MERSENNE_PRIME or 1
+            b = int.from_bytes(digest[8:16], "big") % _MERSENNE_PRIME
+            self._permutations.append((a, b))
+
+    def _words(self, text):
+        return _WORD_RE.findall(text.lower())
+
+    def _shingles(self, text):
+        words = self._words(text)
+        if len(words) < self.shingle_size:
+            return {_hash_token(" ".join(words))} if words else set()
+        return {
+            _hash_token(" ".join(words[i:i + self.shingle_size]))
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def _minhash(self, shingles):
+        if not shingles:
+            return None
+        return [
+            min(((a * s + b) % _MERSENNE_PRIME) & _MAX_HASH for s in shingles)
+            for a, b in self._permutations
+        ]
+
+    def _similarity(self, signature_a, signature_b):
+        if signature_a is None or signature_b is None:
+            return 0.0
+        matches = sum(1 for x, y in zip(signature_a, signature_b) if x == y)
+        return matches / len(signature_a)
+
+    def _relevance_scores(self, query, documents):
+        # Prefer the retriever's own score (Knowledge Bases put it in metadata["score"]),
+        # fall back to query term overlap when it is missing
+        scores = [doc.metadata.get("score") for doc in documents]
+        if any(score is None for score in scores):
+            query_terms = set(self._words(query))
+            scores = []
+            for doc in documents:
+                doc_terms = set(self._words(doc.page_content))
+                scores.append(len(query_terms & doc_terms) / len(query_terms) if query_terms else 0.0)
+        top = max(scores, default=0.0)
+        return [score / top if top > 0 else 0.0 for score in scores]
+
+    def _truncate(self, document, max_tokens):
+        text = document.page_content[:max_tokens * 4]
+        # Cut on the last sentence or line boundary so the passage does not end mid-thought
+        cut = max(text.rfind(". "), text.rfind("\n"))
+        if cut > len(text) // 2:
+            text = text[:cut + 1]
+        return Document(page_content=text.strip(), metadata={**document.metadata, "truncated": True})
+
+    def pack(self, query, documents):
+        """Return the packed documents and the stats for this request"""
+        retrieved_tokens = sum(estimate_tokens(doc.page_content) for doc in documents)
+        stats = {
+            "retrieved": len(documents),
+            "duplicates": 0,
+            "kept": 0,
+            "retrieved_tokens": retrieved_tokens,
+            "packed_tokens": 0,
+            "tokens_saved": retrieved_tokens,
+        }
+        if not documents:
+            return [], stats
+
+        relevance = self._relevance_scores(query, documents)
+        signatures = [self._minhash(self._shingles(doc.page_content)) for doc in documents]
+
+        # Near-duplicate removal, keeping the most relevant copy of each chunk
+        candidates = []
+        for i in sorted(range(len(documents)), key=lambda i: relevance[i], reverse=True):
+            if any(self._similarity(signatures[i], signatures[j]) >= self.duplicate_threshold for j in candidates):
+                stats["duplicates"] += 1
+                continue
+            candidates.append(i)
+
+        # Maximal marginal relevance ordering
+        ranked = []
+        while candidates:
+            best = max(
+                candidates,
+                key=lambda i: self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * max(
+                    (self._similarity(signatures[i], signatures[j]) for j in ranked), default=0.0
+                ),
+            )
+            ranked.append(best)
+            candidates.remove(best)
+
+        # Greedy packing into the token budget
+        packed = []
+        remaining = self.token_budget
+        for i in ranked:
+            tokens = estimate_tokens(documents[i].page_content)
+            if tokens <= remaining:
+                packed.append(documents[i])
+                remaining -= tokens
+            elif remaining >= self.min_passage_tokens:
+                truncated = self._truncate(documents[i], remaining)
+                packed.append(truncated)
+                remaining -= estimate_tokens(truncated.page_content)
+
+        stats["kept"] = len(packed)
+        stats["packed_tokens"] = self.token_budget - remaining
+        stats["tokens_saved"] = retrieved_tokens - stats["packed_tokens"]
+        return packed, stats
@@ -5,14 +5,18 @@ from langchain_aws.retrievers import AmazonKnowledgeBasesRetriever
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 import logging
+from chatbot.context import ContextPacker
 
 logger = logging.getLogger(__name__)
 
 class ChatbotCore:
-    def __init__(self, model_id, kb_id):
+    def __init__(self, model_id, kb_id, num_results=5, context_token_budget=1500):
         self.model_id = model_id
         self.kb_id = kb_id
+        self.num_results = num_results
+        self.context_packer = ContextPacker(token_budget=context_token_budget)
         
         # Initialize Bedrock client
         session = boto3.session.Session()
@@ -27,12 +31,25 @@ class ChatbotCore:
             knowledge_base_id=self.kb_id,
             retrieval_config={
                 "vectorSearchConfiguration": {
-                    "numberOfResults": 5,
+                    "numberOfResults": self.num_results,
                     "overrideSearchType": "SEMANTIC"
                 }
             }
         )
 
+    def _retrieve_context(self, inputs):
+        query = inputs["input"]
+        documents = self.retriever.invoke(query)
+        packed, stats = self.context_packer.pack(query, documents)
+
+        # Log the context packing
+        logger.info(
+            f"Context packing: kept {stats['kept']}/{stats['retrieved']} documents "
+            f"({stats['duplicates']} near-duplicates), {stats['packed_tokens']} tokens, "
+            f"saved {stats['tokens_saved']} of {stats['retrieved_tokens']} tokens"
+        )
+        return packed
+
     def _create_system_message(self):
         return {
             "role": "system",
@@ -113,7 +130,7 @@ class ChatbotCore:
             prompt=self._create_chat_prompt(history),
         )
         response_chain = create_retrieval_chain(
-            retriever=self.retriever,
+            retriever=RunnableLambda(self._retrieve_context),
             combine_docs_chain=document_chain
         )
         